@@ -39,6 +39,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'diary_app.middleware.UserTimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -49,7 +50,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -57,6 +57,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Скомпилированные шаблоны кэшируются в памяти процесса
+            # (в DEBUG кэш сбрасывается автоперезагрузкой при изменении файлов)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -75,6 +83,41 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Кэш должен быть общим для всех воркеров и храниться в памяти: в нем
+# состояние автосохранения черновиков (запись каждые несколько секунд),
+# версии индексов похожих записей, индексы тегов и часовые пояса
+# пользователей. С REDIS_URL - Redis (нужен пакет redis), с
+# MEMCACHED_LOCATION - Memcached (нужен пакет pymemcache), иначе -
+# LocMemCache, который годится только для одного воркера.
+# Проверяется в DiaryAppConfig.ready()
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'memind',
+            # По умолчанию 300 записей: карточки вытесняли бы черновики
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -118,6 +161,68 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Отдача фотографий записей (diary_app.media)
+# None - FileResponse (sendfile через wsgi.file_wrapper),
+# 'nginx' - X-Accel-Redirect, 'xsendfile' - X-Sendfile
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND') or None
+# internal-локация nginx, указывающая на MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Загрузка фотографий (diary_app.uploads)
+# Файлы сразу пишутся на диск, лишние байты не держатся в памяти
+FILE_UPLOAD_HANDLERS = ['diary_app.uploads.LimitedUploadHandler']
+# Жесткий предел парсера (голый 400); обычный предел - DIARY_UPLOAD_MAX_FILES,
+# о нем пользователь узнает из ошибки формы
+DATA_UPLOAD_MAX_NUMBER_FILES = 100
+DIARY_UPLOAD_MAX_FILES = 10
+DIARY_UPLOAD_MAX_FILE_SIZE = 15 * 1024 * 1024
+DIARY_UPLOAD_MAX_REQUEST_SIZE = 60 * 1024 * 1024
+DIARY_IMAGE_MAX_PIXELS = 50_000_000
+DIARY_IMAGE_MAX_SIDE = 2560
+
+# Архив старых записей (manage.py archive_entries)
+DIARY_ARCHIVE_AFTER_DAYS = 365
+DIARY_ARCHIVE_MIN_LENGTH = 1000
+DIARY_ARCHIVE_PREVIEW_WORDS = 30
+
+# История изменений записей (diary_app.revisions, manage.py prune_revisions)
+DIARY_REVISION_SNAPSHOT_EVERY = 10
+DIARY_REVISION_KEEP_RECENT = 20
+DIARY_REVISION_KEEP_DAILY_DAYS = 30
+
+# Автосохранение черновиков (diary_app.drafts)
+DIARY_DRAFT_FLUSH_INTERVAL = 60
+DIARY_DRAFT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Похожие записи (diary_app.similarity, manage.py rebuild_similarity_index)
+# После изменения размерности нужно перестроить индекс
+DIARY_SIMILAR_DIMENSIONS = 512
+DIARY_SIMILAR_MIN_SCORE = 0.1
+# Память процесса под индексы пользователей (float16: 1 КБ на запись при 512)
+DIARY_SIMILAR_CACHE_BYTES = 256 * 1024 * 1024
+
+# Прогрев воркера при старте (diary_app.warmup, manage.py profile_startup)
+DIARY_WARMUP = os.environ.get('DIARY_WARMUP', '') == '1'
+
+# Автодополнение тегов (diary_app.tags)
+DIARY_TAG_INDEX_TIMEOUT = 60 * 60 * 24
+
+# Кэш карточек записей в списке (diary_app.cards)
+DIARY_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Окно отмены удаления в секундах (diary_app.deletion, manage.py purge_deleted_entries)
+DIARY_UNDO_DELETE_WINDOW = 60 * 10
+
+# Сколько секунд часовой пояс пользователя живет в кэше (UserProfile.timezone_for)
+DIARY_TIMEZONE_CACHE_TIMEOUT = 60 * 5
+
+# Резервные копии (manage.py backup / restore)
+DIARY_BACKUP_DIR = Path(os.environ.get('DIARY_BACKUP_DIR', BASE_DIR / 'backups'))
+DIARY_BACKUP_PAGES = 256
+DIARY_BACKUP_PAUSE = 0.05
+DIARY_BACKUP_MAX_RESTARTS = 3
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
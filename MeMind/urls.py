@@ -12,6 +12,7 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Фотографии записей (diary_images/) отдаются только через diary_app.views.image_serve
+    urlpatterns += static(settings.MEDIA_URL + 'avatars/', document_root=settings.MEDIA_ROOT / 'avatars')
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
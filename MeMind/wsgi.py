@@ -15,3 +15,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MeMind.settings')
 
 application = get_wsgi_application()
 
+# Прогрев воркера (шаблоны, URL, Pillow, БД), если включен DIARY_WARMUP
+from diary_app.warmup import warm_up_if_enabled  # noqa: E402
+
+warm_up_if_enabled()
+
@@ -1,17 +1,42 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
 from django.utils.html import format_html
+from .media import serve_protected
 from .models import DiaryEntry, UserProfile, EntryImage
+from .uploads import get_rejected_uploads
+
+
+class RejectedUploadsAdminMixin:
+    """Показывает файлы, отброшенные LimitedUploadHandler, ошибкой формы.
+
+    Иначе админка сохраняла бы объект без файла и сообщала об успехе.
+    """
+    
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        
+        class RejectedUploadsForm(form):
+            def clean(self):
+                cleaned_data = super().clean()
+                for message in get_rejected_uploads(request):
+                    self.add_error(None, message)
+                return cleaned_data
+        
+        RejectedUploadsForm.__name__ = form.__name__
+        return RejectedUploadsForm
 
 
 @admin.register(DiaryEntry)
 class DiaryEntryAdmin(admin.ModelAdmin):
     """Админка для записей дневника"""
     list_display = ('id', 'user', 'title_preview', 'mood', 'created_at', 'is_favorite', 'content_preview')
-    list_filter = ('created_at', 'mood', 'is_favorite', 'user')
+    list_filter = ('created_at', 'mood', 'is_favorite', 'is_archived', 'deleted_at', 'user')
     search_fields = ('title', 'content', 'user__username', 'tags')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'is_archived', 'deleted_at')
     date_hierarchy = 'created_at'
     list_per_page = 25
     list_editable = ('is_favorite',)
@@ -24,7 +49,7 @@ class DiaryEntryAdmin(admin.ModelAdmin):
             'fields': ('tags', 'is_favorite')
         }),
         ('Временные метки', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'is_archived', 'deleted_at'),
             'classes': ('collapse',)
         }),
     )
@@ -42,13 +67,16 @@ class DiaryEntryAdmin(admin.ModelAdmin):
     content_preview.short_description = 'Содержание'
     
     def get_queryset(self, request):
-        """Оптимизация запросов"""
-        qs = super().get_queryset(request)
+        """Оптимизация запросов; удаленные записи тоже видны"""
+        qs = DiaryEntry.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            qs = qs.order_by(*ordering)
         return qs.select_related('user')
 
 
 @admin.register(EntryImage)
-class EntryImageAdmin(admin.ModelAdmin):
+class EntryImageAdmin(RejectedUploadsAdminMixin, admin.ModelAdmin):
     """Админка для изображений записей"""
     list_display = ('id', 'entry', 'image_preview', 'caption', 'uploaded_at')
     list_filter = ('uploaded_at',)
@@ -68,15 +96,31 @@ class EntryImageAdmin(admin.ModelAdmin):
     def image_preview(self, obj):
         """Превью изображения"""
         if obj.image:
-            return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 8px;" />', obj.image.url)
+            url = reverse('admin:diary_app_entryimage_preview', args=[obj.pk])
+            return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 8px;" />', url)
         return 'Нет изображения'
     image_preview.short_description = 'Превью'
+    
+    def get_urls(self):
+        preview = path(
+            '<int:pk>/preview/',
+            self.admin_site.admin_view(self.preview_view),
+            name='diary_app_entryimage_preview',
+        )
+        return [preview] + super().get_urls()
+    
+    def preview_view(self, request, pk):
+        """Файл фотографии для админки (image_serve отдает только владельцу)"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        image = get_object_or_404(EntryImage, pk=pk)
+        return serve_protected(request, image.image)
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(RejectedUploadsAdminMixin, admin.ModelAdmin):
     """Админка для профилей пользователей"""
-    list_display = ('user', 'birth_date', 'created_at', 'avatar_preview')
+    list_display = ('user', 'birth_date', 'time_zone', 'created_at', 'avatar_preview')
     list_filter = ('created_at',)
     search_fields = ('user__username', 'user__email', 'bio')
     readonly_fields = ('created_at', 'avatar_preview')
@@ -86,7 +130,7 @@ class UserProfileAdmin(admin.ModelAdmin):
             'fields': ('user',)
         }),
         ('Информация', {
-            'fields': ('bio', 'birth_date', 'avatar', 'avatar_preview')
+            'fields': ('bio', 'birth_date', 'time_zone', 'avatar', 'avatar_preview')
         }),
         ('Дата регистрации', {
             'fields': ('created_at',)
@@ -108,7 +152,7 @@ class UserProfileInline(admin.StackedInline):
     verbose_name_plural = 'Профиль'
 
 
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(RejectedUploadsAdminMixin, BaseUserAdmin):
     """Расширенная админка пользователей"""
     inlines = (UserProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'date_joined', 'entry_count')
@@ -1,4 +1,20 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Кэши в памяти, общие для всех воркеров
+SHARED_MEMORY_CACHES = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django_redis.cache.RedisCache',
+)
+# Кэш в памяти, у каждого процесса свой
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
 
 
 class DiaryAppConfig(AppConfig):
@@ -7,4 +23,29 @@ class DiaryAppConfig(AppConfig):
     
     def ready(self):
         import diary_app.signals
+        self.check_shared_cache()
+    
+    def check_shared_cache(self):
+        """Не дает запустить приложение без общего кэша в памяти.
+        
+        Черновики, индексы тегов и похожих записей согласуются между
+        воркерами только через общий кэш; с LocMemCache другой воркер
+        видит устаревшие данные и отвечает ложными конфликтами черновиков.
+        
+        Кэш в базе или в файлах не подходит: автосохранение писало бы на
+        диск каждые несколько секунд и занимало блокировку записи SQLite.
+        """
+        workers = int(os.environ.get('WEB_CONCURRENCY') or 1)
+        backend = settings.CACHES['default']['BACKEND']
+        if backend in PROCESS_LOCAL_CACHES:
+            if workers > 1:
+                raise ImproperlyConfigured(
+                    f'WEB_CONCURRENCY={workers}, но кэш {backend} не общий для воркеров. '
+                    'Настройте REDIS_URL или MEMCACHED_LOCATION.'
+                )
+        elif backend not in SHARED_MEMORY_CACHES:
+            raise ImproperlyConfigured(
+                f'Кэш {backend} не подходит для черновиков: нужен Redis или Memcached '
+                '(REDIS_URL или MEMCACHED_LOCATION), для одного воркера - LocMemCache.'
+            )
 
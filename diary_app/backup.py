@@ -0,0 +1,281 @@
+"""
+Резервные копии базы и медиафайлов.
+
+Каталог DIARY_BACKUP_DIR::
+
+    objects/ab/abcdef...    содержимое по SHA-256 (куски базы и медиафайлы)
+    snapshots/<имя>.json    манифест снимка
+
+Снимок базы снимается онлайн-API бэкапа SQLite по DIARY_BACKUP_PAGES
+страниц за шаг с паузой DIARY_BACKUP_PAUSE между шагами: во время шага
+пишущие запросы ждут, в паузе - проходят. Копия режется на куски, и в
+objects попадают только куски, которых там еще нет. Медиафайлы тоже
+хранятся по хэшу; файл, у которого размер и время изменения совпадают
+с предыдущим манифестом, не перечитывается.
+
+Место в objects растет с объемом изменений, а время - с размером базы:
+каждый снимок заново копирует всю базу и считает SHA-256 всех ее кусков.
+Экономится только чтение неизменившихся медиафайлов.
+
+Если базу меняет другое соединение, SQLite начинает пошаговое копирование
+заново. Чтобы на базе с постоянной записью снимок все же закончился,
+после DIARY_BACKUP_MAX_RESTARTS перезапусков база копируется одним шагом:
+все это время пишущие запросы ждут (в режиме WAL - не ждут).
+
+Манифест связывает снимок базы с набором медиафайлов. Файлы снимаются после
+базы: все, на что ссылается снимок, уже на диске. Исключение - файл, удаленный
+purge_deleted_entries в промежутке; его запись в снимке уже помечена удаленной.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+# Размер куска базы: изменения в SQLite разбросаны по страницам, и чем
+# меньше кусок, тем меньше неизменных страниц копируется заново
+CHUNK_SIZE = 64 * 1024
+MANIFEST_VERSION = 1
+
+
+class BackupError(Exception):
+    """Снимок поврежден или не найден"""
+
+
+class BackupRestarted(Exception):
+    """Пошаговое копирование базы слишком часто начиналось заново"""
+
+
+def backup_root():
+    return Path(getattr(settings, 'DIARY_BACKUP_DIR', Path(settings.BASE_DIR) / 'backups'))
+
+
+def object_path(root, digest):
+    return root / 'objects' / digest[:2] / digest
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(path, write):
+    """Пишет файл через временный рядом и переименование: на диске либо старое, либо новое"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            write(target)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def store_bytes(root, data):
+    """Кладет кусок в objects, если его там нет; возвращает хэш и признак записи"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = object_path(root, digest)
+    if path.exists():
+        return digest, False
+    write_atomic(path, lambda target: target.write(data))
+    return digest, True
+
+
+def store_file(root, source_path, digest):
+    path = object_path(root, digest)
+    if path.exists():
+        return False
+
+    def copy(target):
+        with open(source_path, 'rb') as source:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+    write_atomic(path, copy)
+    return True
+
+
+def snapshot_database(db_path, target_path, pages, pause=0, max_restarts=3):
+    """Онлайн-копия SQLite в target_path по ``pages`` страниц за шаг.
+
+    Между шагами - пауза ``pause`` секунд. Если копирование начиналось
+    заново больше ``max_restarts`` раз, база копируется одним шагом.
+    Возвращает число перезапусков.
+    """
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            # Базу изменило другое соединение, SQLite начал сначала
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupRestarted()
+        last_remaining = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    source = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except BackupRestarted:
+            source.backup(target, pages=-1)
+        result = target.execute('PRAGMA quick_check').fetchone()[0]
+        if result != 'ok':
+            raise BackupError(f'Копия базы не прошла проверку: {result}')
+    finally:
+        target.close()
+        source.close()
+    return restarts
+
+
+def store_database(root, copy_path):
+    """Режет копию базы на куски в objects, возвращает описание для манифеста"""
+    chunks = []
+    written = 0
+    digest = hashlib.sha256()
+    with open(copy_path, 'rb') as source:
+        for data in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(data)
+            chunk_digest, new = store_bytes(root, data)
+            chunks.append(chunk_digest)
+            written += len(data) if new else 0
+    return {
+        'sha256': digest.hexdigest(),
+        'size': os.path.getsize(copy_path),
+        'chunks': chunks,
+    }, written
+
+
+def store_media(root, media_root, previous):
+    """Снимает MEDIA_ROOT; хэши неизменившихся файлов берутся из предыдущего манифеста"""
+    files = {}
+    written = 0
+    media_root = Path(media_root)
+    if not media_root.exists():
+        return files, written
+    for path in sorted(media_root.rglob('*')):
+        if not path.is_file():
+            continue
+        name = path.relative_to(media_root).as_posix()
+        stat = path.stat()
+        known = previous.get(name)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            digest = known['sha256']
+        else:
+            digest = hash_file(path)
+        if store_file(root, path, digest):
+            written += stat.st_size
+        files[name] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    return files, written
+
+
+def list_snapshots(root=None):
+    """Имена снимков, от старых к новым"""
+    directory = (root or backup_root()) / 'snapshots'
+    if not directory.exists():
+        return []
+    return sorted(path.stem for path in directory.glob('*.json'))
+
+
+def load_manifest(name, root=None):
+    path = (root or backup_root()) / 'snapshots' / f'{name}.json'
+    try:
+        with open(path, encoding='utf-8') as source:
+            manifest = json.load(source)
+    except FileNotFoundError:
+        raise BackupError(f'Снимок {name} не найден') from None
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise BackupError(f'Неизвестная версия манифеста: {manifest.get("version")}')
+    return manifest
+
+
+def save_manifest(root, name, manifest):
+    data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+    write_atomic(root / 'snapshots' / f'{name}.json', lambda target: target.write(data))
+
+
+def verify_object(root, digest):
+    """Проверяет, что объект есть и его содержимое совпадает с хэшем"""
+    path = object_path(root, digest)
+    if not path.exists():
+        raise BackupError(f'Нет объекта {digest}')
+    if hash_file(path) != digest:
+        raise BackupError(f'Объект {digest} поврежден')
+
+
+def referenced_objects(manifest):
+    return set(manifest['database']['chunks']) | {item['sha256'] for item in manifest['media'].values()}
+
+
+def collect_garbage(root, keep):
+    """Удаляет объекты, на которые не ссылается ни один манифест из ``keep``"""
+    referenced = set()
+    for name in keep:
+        referenced |= referenced_objects(load_manifest(name, root))
+    removed = 0
+    for path in (root / 'objects').glob('*/*'):
+        if path.name not in referenced:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def verify_snapshot(root, manifest):
+    """Проверяет контрольные суммы всех объектов снимка (до того, как что-то менять)"""
+    for digest in sorted(referenced_objects(manifest)):
+        verify_object(root, digest)
+
+
+def assemble_database(root, manifest, target_path):
+    """Собирает файл базы из кусков и сверяет его хэш с манифестом"""
+    database = manifest['database']
+    digest = hashlib.sha256()
+
+    def write(target):
+        for chunk_digest in database['chunks']:
+            with open(object_path(root, chunk_digest), 'rb') as source:
+                data = source.read()
+            digest.update(data)
+            target.write(data)
+
+    write_atomic(Path(target_path), write)
+    if digest.hexdigest() != database['sha256']:
+        os.unlink(target_path)
+        raise BackupError('Собранная база не совпадает с контрольной суммой манифеста')
+
+
+def restore_media(root, manifest, media_root, prune=False):
+    """Возвращает MEDIA_ROOT к снимку; совпадающие файлы не переписываются"""
+    media_root = Path(media_root)
+    restored = removed = 0
+    for name, item in manifest['media'].items():
+        path = media_root / name
+        if path.exists() and path.stat().st_size == item['size'] and hash_file(path) == item['sha256']:
+            continue
+
+        def copy(target, digest=item['sha256']):
+            with open(object_path(root, digest), 'rb') as source:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+        write_atomic(path, copy)
+        restored += 1
+    if prune and media_root.exists():
+        for path in media_root.rglob('*'):
+            if path.is_file() and path.relative_to(media_root).as_posix() not in manifest['media']:
+                path.unlink()
+                removed += 1
+    return restored, removed
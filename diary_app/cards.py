@@ -0,0 +1,51 @@
+"""
+Кэш HTML карточек записей для списка дневника.
+
+Ключ карточки строится из pk, updated_at, превью-фото и часового пояса,
+поэтому после сохранения записи ключ меняется сам и старая карточка
+просто истекает. Карточки страницы читаются из кэша одним get_many,
+рендерятся только отсутствующие.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+# Увеличить при изменении entry_card.html
+CARD_TEMPLATE_VERSION = 2
+
+
+def card_cache_key(entry, images, tz_name):
+    first_image = images[0].pk if images else 0
+    return (
+        f'entry_card:{CARD_TEMPLATE_VERSION}:{entry.pk}:{entry.updated_at.timestamp()}:'
+        f'{first_image}:{len(images)}:{tz_name}'
+    )
+
+
+def render_entry_cards(entries):
+    """HTML карточек для записей страницы (images должны быть в prefetch_related)"""
+    tz_name = timezone.get_current_timezone_name()
+    keyed = []
+    for entry in entries:
+        images = list(entry.images.all())
+        keyed.append((card_cache_key(entry, images, tz_name), entry, images))
+
+    cached = cache.get_many([key for key, entry, images in keyed])
+    rendered = {}
+    cards = []
+    for key, entry, images in keyed:
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string('diary_app/entry_card.html', {
+                'entry': entry,
+                'first_image': images[0] if images else None,
+                'image_count': len(images),
+            })
+            rendered[key] = html
+        cards.append(mark_safe(html))
+
+    if rendered:
+        cache.set_many(rendered, getattr(settings, 'DIARY_CARD_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+    return cards
@@ -0,0 +1,105 @@
+"""
+Сжатие текста записей zlib со словарем, обученным на самих записях.
+
+Формат сжатого значения: ``b'Z'`` + id словаря (4 байта, 0 - без словаря)
++ поток zlib. Словари хранятся в CompressionDictionary и никогда не
+удаляются, поэтому любое значение можно распаковать тем словарем,
+которым оно было сжато.
+"""
+import struct
+import zlib
+from collections import Counter
+
+MAGIC = b'Z'
+HEADER = struct.Struct('>cI')
+# Больше 32 КБ zlib все равно не использует
+MAX_DICTIONARY_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 9
+
+# Кэш словарей процесса: id -> bytes; None - еще не загружен последний
+_dictionaries = {}
+_latest_dictionary_id = None
+
+
+def get_dictionary(dictionary_id):
+    """Словарь по id (с кэшем на процесс)"""
+    if dictionary_id not in _dictionaries:
+        from .models import CompressionDictionary
+        _dictionaries[dictionary_id] = bytes(
+            CompressionDictionary.objects.values_list('data', flat=True).get(pk=dictionary_id)
+        )
+    return _dictionaries[dictionary_id]
+
+
+def get_latest_dictionary():
+    """Последний обученный словарь: ``(id, bytes)`` или ``(0, b'')``"""
+    global _latest_dictionary_id
+    if _latest_dictionary_id is None:
+        from .models import CompressionDictionary
+        latest = CompressionDictionary.objects.order_by('-pk').values_list('pk', 'data').first()
+        if latest is None:
+            return 0, b''
+        _latest_dictionary_id = latest[0]
+        _dictionaries[latest[0]] = bytes(latest[1])
+    return _latest_dictionary_id, _dictionaries[_latest_dictionary_id]
+
+
+def reset_dictionary_cache():
+    """Сбрасывает кэш, чтобы подхватить только что обученный словарь"""
+    global _latest_dictionary_id
+    _latest_dictionary_id = None
+    _dictionaries.clear()
+
+
+def compress_text(text):
+    """Сжимает строку последним словарем"""
+    dictionary_id, dictionary = get_latest_dictionary()
+    if dictionary:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    data = compressor.compress(text.encode('utf-8')) + compressor.flush()
+    return HEADER.pack(MAGIC, dictionary_id) + data
+
+
+def decompress_text(value):
+    """Распаковывает значение, сжатое compress_text"""
+    value = bytes(value)
+    magic, dictionary_id = HEADER.unpack_from(value)
+    if magic != MAGIC:
+        raise ValueError('Неизвестный формат сжатого текста')
+    if dictionary_id:
+        decompressor = zlib.decompressobj(zdict=get_dictionary(dictionary_id))
+    else:
+        decompressor = zlib.decompressobj()
+    data = decompressor.decompress(value[HEADER.size:]) + decompressor.flush()
+    return data.decode('utf-8')
+
+
+def train_dictionary(texts, size=MAX_DICTIONARY_SIZE, max_phrase_words=3):
+    """Строит словарь zlib из самых выгодных фраз корпуса.
+
+    Фразы из 1..max_phrase_words слов оцениваются по частоте, умноженной
+    на длину. zlib лучше находит совпадения ближе к концу словаря, поэтому
+    самые выгодные фразы кладутся в конец.
+    """
+    counts = Counter()
+    for text in texts:
+        words = text.split()
+        for n in range(1, max_phrase_words + 1):
+            for i in range(len(words) - n + 1):
+                counts[' '.join(words[i:i + n])] += 1
+
+    scored = sorted(
+        ((count * len(phrase.encode('utf-8')), phrase) for phrase, count in counts.items() if count > 1),
+        reverse=True,
+    )
+    chosen = []
+    total = 0
+    for score, phrase in scored:
+        encoded = phrase.encode('utf-8') + b' '
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
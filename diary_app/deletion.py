@@ -0,0 +1,62 @@
+"""
+Удаление записей с возможностью отмены.
+
+Удаление только проставляет deleted_at одним UPDATE, сколько бы
+фотографий ни было у записи, поэтому запрос на удаление не держит
+блокировку записи SQLite. Пока не истекло окно отмены
+(DIARY_UNDO_DELETE_WINDOW), запись можно вернуть; после этого строки
+записи, ее фотографии и файлы удаляет команда purge_deleted_entries
+небольшими транзакциями.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import similarity
+from .models import DiaryEntry
+from .tags import invalidate_tag_index
+
+UNDO_SESSION_KEY = 'undo_delete'
+
+
+def undo_window():
+    return timedelta(seconds=getattr(settings, 'DIARY_UNDO_DELETE_WINDOW', 60 * 10))
+
+
+def soft_delete_entries(user_id, pks):
+    """Скрывает записи пользователя, возвращает число удаленных"""
+    count = DiaryEntry.objects.filter(user_id=user_id, pk__in=pks).soft_delete()
+    if count:
+        # update() не вызывает сигналы - убираем записи из индексов сами
+        invalidate_tag_index(user_id)
+        similarity.remove_entries(user_id, pks)
+    return count
+
+
+def restore_entries(user_id, pks):
+    """Возвращает записи, удаленные не раньше окна отмены"""
+    count = (
+        DiaryEntry.all_objects
+        .filter(user_id=user_id, pk__in=pks, deleted_at__gte=timezone.now() - undo_window())
+        .restore()
+    )
+    if count:
+        invalidate_tag_index(user_id)
+        # Векторы остались в EntryVector - индексы перечитаются по новой версии
+        similarity.bump_version(user_id)
+    return count
+
+
+def remember_for_undo(request, pks):
+    """Запоминает в сессии последние удаленные записи для кнопки «Отменить»"""
+    until = timezone.now() + undo_window()
+    request.session[UNDO_SESSION_KEY] = {'ids': list(pks), 'until': until.timestamp()}
+
+
+def pending_undo(request):
+    """Записи, удаление которых еще можно отменить"""
+    undo = request.session.get(UNDO_SESSION_KEY)
+    if undo and undo['until'] > timezone.now().timestamp():
+        return undo['ids']
+    return []
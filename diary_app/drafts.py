@@ -0,0 +1,137 @@
+"""
+Автосохранение черновиков.
+
+Частые сохранения из редактора пишутся только в кэш. В таблицу Draft
+черновик попадает не чаще раза в DIARY_DRAFT_FLUSH_INTERVAL секунд
+или когда редактор простаивает/закрывается (клиент присылает flush).
+Каждое сохранение увеличивает версию; если вкладка прислала изменения
+поверх устаревшей версии, это конфликт. Сравнение и запись версии идут
+под блокировкой в кэше (cache.add атомарен в Redis, Memcached и
+LocMemCache), поэтому из двух одновременных сохранений одно получает
+конфликт, а не затирает другое.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Draft
+
+DRAFT_FIELDS = ('title', 'content', 'mood', 'tags')
+
+
+# Сколько ждать блокировку черновика и через сколько она снимается сама,
+# если воркер упал посреди сохранения
+LOCK_WAIT = 2
+LOCK_TIMEOUT = 10
+
+
+class DraftConflict(Exception):
+    """Черновик уже изменен в другой вкладке"""
+
+    def __init__(self, state):
+        super().__init__('Черновик изменен в другой вкладке')
+        self.state = state
+
+
+def flush_interval():
+    return getattr(settings, 'DIARY_DRAFT_FLUSH_INTERVAL', 60)
+
+
+def cache_key(user_id, entry_id):
+    return f'draft:{user_id}:{entry_id or "new"}'
+
+
+def lock_key(user_id, entry_id):
+    return f'draft-lock:{user_id}:{entry_id or "new"}'
+
+
+@contextmanager
+def draft_lock(user_id, entry_id):
+    """Блокировка черновика на время сравнения и записи версии.
+
+    Возвращает False, если блокировку не удалось взять за LOCK_WAIT секунд.
+    """
+    key = lock_key(user_id, entry_id)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, token, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.02)
+    try:
+        yield True
+    finally:
+        # Не снимаем чужую блокировку, если наша успела истечь
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def get_draft_state(user, entry_id=None):
+    """Текущее состояние черновика из кэша или из БД, либо None"""
+    state = cache.get(cache_key(user.pk, entry_id))
+    if state is not None:
+        return state
+    draft = Draft.objects.filter(user=user, entry_id=entry_id).first()
+    if draft is None:
+        return None
+    state = {field: getattr(draft, field) for field in DRAFT_FIELDS}
+    state.update(version=draft.version, saved_at=draft.updated_at, flushed_at=draft.updated_at, dirty=False)
+    return state
+
+
+def flush_draft(user, entry_id, state):
+    """Записывает черновик из кэша в таблицу Draft"""
+    values = {field: state[field] for field in DRAFT_FIELDS}
+    values['version'] = state['version']
+    Draft.objects.update_or_create(user=user, entry_id=entry_id, defaults=values)
+    state['flushed_at'] = timezone.now()
+    state['dirty'] = False
+
+
+def autosave_draft(user, entry_id, data, base_version, force_flush=False):
+    """Сохраняет изменения черновика поверх версии ``base_version``.
+
+    Возвращает новое состояние; при несовпадении версий - DraftConflict.
+    """
+    with draft_lock(user.pk, entry_id) as locked:
+        state = get_draft_state(user, entry_id)
+        if not locked:
+            # Черновик сейчас сохраняет другая вкладка
+            raise DraftConflict(state)
+        return save_state(user, entry_id, state, data, base_version, force_flush)
+
+
+def save_state(user, entry_id, state, data, base_version, force_flush):
+    """Сравнение версий и запись (вызывается под блокировкой черновика)"""
+    now = timezone.now()
+    if state is None:
+        state = {field: '' for field in DRAFT_FIELDS}
+        state.update(version=0, flushed_at=None, dirty=False)
+    if base_version != state['version']:
+        raise DraftConflict(state)
+
+    for field in DRAFT_FIELDS:
+        state[field] = data.get(field, '')
+    state['version'] += 1
+    state['saved_at'] = now
+    state['dirty'] = True
+
+    flushed_at = state['flushed_at']
+    if force_flush or flushed_at is None or (now - flushed_at).total_seconds() >= flush_interval():
+        flush_draft(user, entry_id, state)
+
+    cache.set(cache_key(user.pk, entry_id), state, getattr(settings, 'DIARY_DRAFT_CACHE_TIMEOUT', 60 * 60 * 24))
+    return state
+
+
+def discard_draft(user, entry_id=None):
+    """Удаляет черновик (после сохранения записи или по просьбе пользователя)"""
+    with draft_lock(user.pk, entry_id):
+        # Без блокировки запоздавшее автосохранение могло бы вернуть черновик
+        cache.delete(cache_key(user.pk, entry_id))
+        Draft.objects.filter(user=user, entry_id=entry_id).delete()
@@ -0,0 +1,33 @@
+from django.db import models
+
+from .compression import compress_text, decompress_text
+
+
+class CompressedTextField(models.BinaryField):
+    """Текстовое поле, которое хранится в БД сжатым (см. compression.py).
+
+    В Python значение всегда строка: сжатие и распаковка происходят
+    при записи в БД и чтении из нее.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def get_default(self):
+        default = super().get_default()
+        return '' if default == b'' else default
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, str):
+            value = compress_text(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -2,6 +2,32 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from .models import DiaryEntry, UserProfile
+from .timezones import timezone_choices
+from .uploads import normalize_image
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    """Поле выбора нескольких файлов"""
+    allow_multiple_selected = True
+
+
+class MultipleImageField(forms.FileField):
+    """Поле для нескольких изображений, возвращает список файлов"""
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput(attrs={
+            'class': 'form-input',
+            'accept': 'image/*'
+        }))
+        super().__init__(*args, **kwargs)
+    
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(item, initial) for item in data]
+        if data:
+            return [single_file_clean(data, initial)]
+        return []
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -98,7 +124,8 @@ class DiaryEntryForm(forms.ModelForm):
         required=False,
         widget=forms.TextInput(attrs={
             'class': 'form-input',
-            'placeholder': 'Теги через запятую'
+            'placeholder': 'Теги через запятую',
+            'autocomplete': 'off'
         }),
         label='Теги'
     )
@@ -109,10 +136,25 @@ class DiaryEntryForm(forms.ModelForm):
         }),
         label='Добавить в избранное'
     )
+    images = MultipleImageField(
+        required=False,
+        label='Фотографии'
+    )
     
     class Meta:
         model = DiaryEntry
         fields = ('title', 'content', 'mood', 'tags', 'is_favorite')
+    
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_uploads = list(rejected_uploads)
+    
+    def clean_images(self):
+        """Проверка и нормализация загруженных фотографий"""
+        if self.rejected_uploads:
+            raise forms.ValidationError(self.rejected_uploads)
+        images = self.cleaned_data.get('images') or []
+        return [normalize_image(image) for image in images]
 
 
 class UserProfileForm(forms.ModelForm):
@@ -142,7 +184,26 @@ class UserProfileForm(forms.ModelForm):
         label='Аватар'
     )
     
+    time_zone = forms.ChoiceField(
+        required=False,
+        choices=timezone_choices,
+        widget=forms.Select(attrs={
+            'class': 'form-select'
+        }),
+        label='Часовой пояс'
+    )
+    
     class Meta:
         model = UserProfile
-        fields = ('bio', 'birth_date', 'avatar')
+        fields = ('bio', 'birth_date', 'time_zone', 'avatar')
+    
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_uploads = list(rejected_uploads)
+    
+    def clean_avatar(self):
+        """Аватар, отброшенный при приеме, - ошибка, а не пустое поле"""
+        if self.rejected_uploads:
+            raise forms.ValidationError(self.rejected_uploads)
+        return self.cleaned_data.get('avatar')
 
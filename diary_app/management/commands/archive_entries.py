@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from diary_app.models import ArchivedContent, DiaryEntry, search_words
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит полный текст старых длинных записей в сжатый архив. '
+        'В записи остается начало текста для списка и поиска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'DIARY_ARCHIVE_AFTER_DAYS', 365),
+            help='Архивировать записи, не менявшиеся дольше этого числа дней'
+        )
+        parser.add_argument(
+            '--min-length', type=int,
+            default=getattr(settings, 'DIARY_ARCHIVE_MIN_LENGTH', 1000),
+            help='Минимальная длина текста в символах'
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--vacuum', action='store_true', help='Выполнить VACUUM после архивации (SQLite)')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        preview_words = getattr(settings, 'DIARY_ARCHIVE_PREVIEW_WORDS', 30)
+        candidates = (
+            DiaryEntry.objects
+            .filter(is_archived=False, is_favorite=False, updated_at__lt=cutoff)
+            .order_by('pk')
+        )
+
+        archived = saved = 0
+        last_pk = 0
+        while True:
+            batch = [
+                entry for entry in
+                candidates.filter(pk__gt=last_pk).only('pk', 'content')[:options['batch_size']]
+            ]
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            batch = [entry for entry in batch if len(entry.content) >= options['min_length']]
+            if not batch or options['dry_run']:
+                archived += len(batch)
+                continue
+
+            with transaction.atomic():
+                ArchivedContent.objects.bulk_create([
+                    ArchivedContent(entry=entry, content=entry.content, search_text=search_words(entry.content))
+                    for entry in batch
+                ])
+                for entry in batch:
+                    preview = Truncator(entry.content).words(preview_words)
+                    saved += len(entry.content) - len(preview)
+                    entry.content = preview
+                    entry.is_archived = True
+                # bulk_update не трогает updated_at (auto_now)
+                DiaryEntry.objects.bulk_update(batch, ['content', 'is_archived'])
+            archived += len(batch)
+
+        if options['dry_run']:
+            self.stdout.write(f'Будет архивировано записей: {archived}')
+            return
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Архивировано записей: {archived}, вынесено из основной таблицы символов: {saved}'
+        ))
@@ -0,0 +1,100 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from diary_app.backup import (
+    MANIFEST_VERSION,
+    BackupError,
+    backup_root,
+    collect_garbage,
+    list_snapshots,
+    load_manifest,
+    save_manifest,
+    snapshot_database,
+    store_database,
+    store_media,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Снимает резервную копию базы (онлайн-API бэкапа SQLite) и MEDIA_ROOT. '
+        'Копируются только изменившиеся куски базы и файлы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int,
+            default=getattr(settings, 'DIARY_BACKUP_PAGES', 256),
+            help='Страниц базы за один шаг копирования; между шагами база доступна для записи'
+        )
+        parser.add_argument(
+            '--pause', type=float,
+            default=getattr(settings, 'DIARY_BACKUP_PAUSE', 0.05),
+            help='Пауза между шагами копирования базы, секунд'
+        )
+        parser.add_argument('--keep', type=int, help='Оставить столько последних снимков, остальные удалить')
+        parser.add_argument('--list', action='store_true', help='Показать снимки и выйти')
+
+    def handle(self, *args, **options):
+        root = backup_root()
+        snapshots = list_snapshots(root)
+        if options['list']:
+            for name in snapshots:
+                manifest = load_manifest(name, root)
+                self.stdout.write(
+                    f"{name}  база {manifest['database']['size']} байт, файлов {len(manifest['media'])}"
+                )
+            return
+
+        if connection.vendor != 'sqlite':
+            raise CommandError('Онлайн-бэкап поддерживается только для SQLite')
+        if options['keep'] is not None and options['keep'] < 1:
+            raise CommandError('--keep должен быть не меньше 1')
+
+        now = timezone.now()
+        name = now.strftime('%Y%m%d-%H%M%S')
+        if name in snapshots:
+            raise CommandError(f'Снимок {name} уже есть')
+        previous = load_manifest(snapshots[-1], root)['media'] if snapshots else {}
+
+        root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=root, prefix='.snapshot-') as tmp:
+            copy_path = Path(tmp) / 'db.sqlite3'
+            try:
+                restarts = snapshot_database(
+                    settings.DATABASES['default']['NAME'], copy_path, options['pages'], options['pause'],
+                    getattr(settings, 'DIARY_BACKUP_MAX_RESTARTS', 3),
+                )
+            except (BackupError, sqlite3.Error) as error:
+                raise CommandError(f'Не удалось снять копию базы: {error}')
+            database, database_written = store_database(root, copy_path)
+        if restarts:
+            self.stdout.write(f'Копирование базы начиналось заново: {restarts} раз')
+        # Файлы - после базы, чтобы все, на что ссылается снимок, уже было на диске
+        media, media_written = store_media(root, settings.MEDIA_ROOT, previous)
+
+        save_manifest(root, name, {
+            'version': MANIFEST_VERSION,
+            'created_at': now.isoformat(),
+            'database': database,
+            'media': media,
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок {name}: база {database["size"]} байт (записано {database_written}), '
+            f'файлов {len(media)} (записано {media_written} байт)'
+        ))
+
+        if options['keep']:
+            snapshots = list_snapshots(root)
+            expired, kept = snapshots[:-options['keep']], snapshots[-options['keep']:]
+            for old in expired:
+                (root / 'snapshots' / f'{old}.json').unlink()
+            if expired:
+                removed = collect_garbage(root, kept)
+                self.stdout.write(f'Удалено снимков: {len(expired)}, объектов: {removed}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from diary_app.query_plans import check_diary_queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет через EXPLAIN QUERY PLAN запросы diary_view для всех сочетаний '
+        'фильтров на текущей базе (то же проверяют тесты diary_app). Завершается '
+        'с ошибкой, если запрос просматривает таблицу целиком, отбирает строки по '
+        'индексу без нужных фильтру столбцов или сортирует строки ради одной страницы.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Разбор планов запросов реализован только для SQLite')
+
+        failures = []
+        for name, plan, problems in check_diary_queries():
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            if problems:
+                failures.append(f'{name}: {"; ".join(problems)}\n{plan}')
+
+        if failures:
+            raise CommandError('Запросы без подходящего индекса:\n\n' + '\n\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все запросы diary_view идут по подходящим индексам'))
@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном интерпретаторе, чтобы импорты были холодными
+BOOT_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+phases = {"django.setup": time.perf_counter() - started}
+mark = time.perf_counter()
+from MeMind.wsgi import application
+phases["wsgi application"] = time.perf_counter() - mark
+warmup = {}
+if "--warmup" in sys.argv:
+    from diary_app.warmup import warm_up
+    warmup = warm_up()
+phases["total"] = time.perf_counter() - started
+print(json.dumps({"phases": phases, "warmup": warmup}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Показывает время импорта модулей и этапов запуска воркера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Сколько самых медленных модулей показать')
+        parser.add_argument('--warmup', action='store_true', help='Также замерить шаги прогрева')
+        parser.add_argument(
+            '--group', action='store_true',
+            help='Суммировать время по пакетам верхнего уровня'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'MeMind.settings'))
+        # Прогрев из wsgi.py замеряется отдельно, если запрошен
+        env['DIARY_WARMUP'] = '0'
+        command = [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT]
+        if options['warmup']:
+            command.append('--warmup')
+        result = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+            raise CommandError('\n'.join(errors[-10:]))
+
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = self.parse_importtime(result.stderr)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Этапы запуска'))
+        for name, seconds in report['phases'].items():
+            self.stdout.write(f'  {name:<24} {seconds * 1000:9.1f} мс')
+        if report['warmup']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Прогрев'))
+            for name, seconds in report['warmup'].items():
+                self.stdout.write(f'  {name:<24} {seconds * 1000:9.1f} мс')
+
+        if options['group']:
+            grouped = defaultdict(int)
+            for module, (self_us, cumulative_us) in imports.items():
+                grouped[module.split('.')[0]] += self_us
+            rows = sorted(grouped.items(), key=lambda item: -item[1])[:options['top']]
+            self.stdout.write(self.style.MIGRATE_HEADING('Импорт по пакетам (собственное время)'))
+            for package, self_us in rows:
+                self.stdout.write(f'  {self_us / 1000:9.1f} мс  {package}')
+        else:
+            rows = sorted(imports.items(), key=lambda item: -item[1][1])[:options['top']]
+            self.stdout.write(self.style.MIGRATE_HEADING('Импорт модулей (с вложенными / собственное)'))
+            for module, (self_us, cumulative_us) in rows:
+                self.stdout.write(f'  {cumulative_us / 1000:9.1f} мс {self_us / 1000:9.1f} мс  {module}')
+
+    def parse_importtime(self, output):
+        """Разбирает вывод ``-X importtime``: модуль -> (собственное, общее) в мкс"""
+        imports = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            imports[module.strip()] = (int(self_us), int(cumulative_us))
+        return imports
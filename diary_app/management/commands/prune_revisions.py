@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from diary_app.models import DiaryEntry
+from diary_app.revisions import prune_revisions
+
+
+class Command(BaseCommand):
+    help = (
+        'Прореживает историю изменений: последние версии сохраняются все, '
+        'за последние дни - по одной в день, более старые - по одной в месяц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-recent', type=int,
+            default=getattr(settings, 'DIARY_REVISION_KEEP_RECENT', 20),
+        )
+        parser.add_argument(
+            '--keep-daily-days', type=int,
+            default=getattr(settings, 'DIARY_REVISION_KEEP_DAILY_DAYS', 30),
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_recent'] < 0 or options['keep_daily_days'] < 0:
+            raise CommandError('--keep-recent и --keep-daily-days не могут быть отрицательными')
+        now = timezone.now()
+        entries = (
+            DiaryEntry.objects
+            .annotate(revision_count=Count('revisions'))
+            .filter(revision_count__gt=options['keep_recent'])
+            .only('pk')
+        )
+        removed = 0
+        for entry in entries.iterator():
+            removed += prune_revisions(entry, options['keep_recent'], options['keep_daily_days'], now)
+        self.stdout.write(self.style.SUCCESS(f'Удалено версий: {removed}'))
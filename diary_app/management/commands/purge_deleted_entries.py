@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from diary_app.deletion import undo_window
+from diary_app.models import DiaryEntry, EntryImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Окончательно удаляет записи, помеченные удаленными, вместе с фотографиями '
+        'и их файлами. Удаляет небольшими транзакциями, чтобы не держать '
+        'блокировку записи SQLite.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            default=int(undo_window().total_seconds()),
+            help='Удалять записи, удаленные раньше этого числа секунд назад (по умолчанию - окно отмены)'
+        )
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах, чтобы пропустить запросы пользователей'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+        expired = DiaryEntry.all_objects.filter(deleted_at__lt=cutoff)
+
+        if options['dry_run']:
+            images = EntryImage.objects.filter(entry__in=expired).count()
+            self.stdout.write(f'Будет удалено записей: {expired.count()}, фотографий: {images}')
+            return
+
+        storage = EntryImage._meta.get_field('image').storage
+        entries = files = 0
+        while True:
+            pks = list(expired.order_by('deleted_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            names = list(EntryImage.objects.filter(entry_id__in=pks).exclude(image='').values_list('image', flat=True))
+
+            with transaction.atomic():
+                # Каскадом удаляются фотографии, версии, черновики и векторы
+                DiaryEntry.all_objects.filter(pk__in=pks).delete()
+            entries += len(pks)
+
+            # Файлы - только после фиксации транзакции: при откате строки
+            # остались бы без файлов
+            for name in names:
+                storage.delete(name)
+                files += 1
+
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {entries}, файлов: {files}'))
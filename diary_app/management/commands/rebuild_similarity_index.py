@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from diary_app.models import DiaryEntry, EntryVector
+from diary_app.similarity import bump_version, dimensions
+from diary_app.vectors import vectorize_rows
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает векторы всех записей для поиска похожих записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Число процессов')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def batches(self, batch_size):
+        """Пачки ``(pk, title, content, tags)`` с полным текстом архивных записей"""
+        entries = (
+            DiaryEntry.objects
+            .select_related('archived_content')
+            .only('pk', 'title', 'content', 'tags', 'is_archived', 'archived_content__content')
+            .order_by('pk')
+        )
+        last_pk = 0
+        while True:
+            batch = list(entries.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield [
+                (
+                    entry.pk,
+                    entry.title,
+                    entry.archived_content.content if entry.is_archived else entry.content,
+                    entry.tags,
+                )
+                for entry in batch
+            ]
+
+    def handle(self, *args, **options):
+        size = dimensions()
+        total = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [
+                executor.submit(vectorize_rows, rows, size)
+                for rows in self.batches(options['batch_size'])
+            ]
+            for future in futures:
+                vectors = [EntryVector(entry_id=pk, vector=vector) for pk, vector in future.result()]
+                EntryVector.objects.bulk_create(
+                    vectors,
+                    update_conflicts=True,
+                    unique_fields=['entry'],
+                    update_fields=['vector'],
+                )
+                total += len(vectors)
+
+        # Процессы сайта перечитают индексы при следующем запросе
+        for user_id in DiaryEntry.objects.values_list('user_id', flat=True).distinct():
+            bump_version(user_id)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано векторов: {total}'))
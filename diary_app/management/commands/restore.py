@@ -0,0 +1,89 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from diary_app.backup import (
+    BackupError,
+    assemble_database,
+    backup_root,
+    list_snapshots,
+    load_manifest,
+    restore_media,
+    verify_snapshot,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Восстанавливает базу и MEDIA_ROOT из снимка manage.py backup. '
+        'Перед восстановлением проверяет контрольные суммы всех файлов снимка.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', nargs='?', help='Имя снимка (по умолчанию - последний)')
+        parser.add_argument('--skip-media', action='store_true', help='Восстановить только базу')
+        parser.add_argument('--prune-media', action='store_true', help='Удалить файлы, которых нет в снимке')
+        parser.add_argument('--verify-only', action='store_true', help='Только проверить снимок')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Восстановление поддерживается только для SQLite')
+        root = backup_root()
+        name = options['snapshot']
+        if name is None:
+            snapshots = list_snapshots(root)
+            if not snapshots:
+                raise CommandError(f'В {root} нет снимков')
+            name = snapshots[-1]
+
+        try:
+            manifest = load_manifest(name, root)
+            verify_snapshot(root, manifest)
+        except BackupError as error:
+            raise CommandError(str(error))
+        self.stdout.write(f'Снимок {name} от {manifest["created_at"]}: контрольные суммы совпадают')
+        if options['verify_only']:
+            return
+
+        if options['interactive']:
+            answer = input('Текущая база и файлы будут заменены снимком. Введите "yes" для продолжения: ')
+            if answer != 'yes':
+                raise CommandError('Восстановление отменено')
+
+        db_path = Path(settings.DATABASES['default']['NAME'])
+        restored_path = db_path.with_name(f'.{db_path.name}.restore')
+        try:
+            assemble_database(root, manifest, restored_path)
+            check = sqlite3.connect(restored_path)
+            try:
+                result = check.execute('PRAGMA quick_check').fetchone()[0]
+            finally:
+                check.close()
+            if result != 'ok':
+                raise BackupError(f'Восстановленная база не прошла проверку: {result}')
+        except BackupError as error:
+            restored_path.unlink(missing_ok=True)
+            raise CommandError(str(error))
+
+        connections.close_all()
+        # Журнал WAL от старой базы применился бы к новой и испортил ее
+        for suffix in ('-wal', '-shm', '-journal'):
+            Path(f'{db_path}{suffix}').unlink(missing_ok=True)
+        os.replace(restored_path, db_path)
+
+        restored = removed = 0
+        if not options['skip_media']:
+            restored, removed = restore_media(root, manifest, settings.MEDIA_ROOT, options['prune_media'])
+
+        # Индексы тегов, похожих записей и карточки в кэше относятся к старой базе
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'База восстановлена из снимка {name}; файлов восстановлено: {restored}, удалено: {removed}. '
+            'Перезапустите воркеры: их кэши в памяти относятся к прежней базе.'
+        ))
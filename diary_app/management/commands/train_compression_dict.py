@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from diary_app.compression import MAX_DICTIONARY_SIZE, reset_dictionary_cache, train_dictionary
+from diary_app.models import CompressionDictionary, DiaryEntry
+
+
+class Command(BaseCommand):
+    help = 'Обучает словарь zlib на текстах записей для сжатия архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=2000, help='Сколько записей взять в выборку')
+        parser.add_argument('--size', type=int, default=MAX_DICTIONARY_SIZE, help='Размер словаря в байтах')
+
+    def handle(self, *args, **options):
+        texts = list(
+            DiaryEntry.objects.filter(is_archived=False)
+            .order_by('?')
+            .values_list('content', flat=True)[:options['sample']]
+        )
+        if not texts:
+            self.stdout.write('Нет записей для обучения')
+            return
+
+        data = train_dictionary(texts, size=min(options['size'], MAX_DICTIONARY_SIZE))
+        dictionary = CompressionDictionary.objects.create(data=data, sample_size=len(texts))
+        reset_dictionary_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'Словарь {dictionary.pk}: {len(data)} байт по {len(texts)} записям'
+        ))
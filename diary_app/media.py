@@ -0,0 +1,154 @@
+"""
+Отдача закрытых медиафайлов (фотографий записей).
+
+Права доступа проверяет Django, а сами байты отдает веб-сервер:
+через X-Accel-Redirect (nginx) или X-Sendfile (Apache/lighttpd).
+Без фронтенд-сервера используется FileResponse, который под gunicorn
+уходит в wsgi.file_wrapper, то есть в os.sendfile().
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Файл, из которого можно прочитать не больше ``length`` байт.
+
+    ``fileno()`` остается доступным, поэтому wsgi.file_wrapper сервера
+    по-прежнему может отдать диапазон через sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def make_etag(stat):
+    """Сильный ETag из времени изменения и размера файла"""
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_range(header, size):
+    """Разбирает одиночный диапазон ``bytes=a-b``.
+
+    Возвращает ``(start, end)`` включительно, ``None``, если заголовок
+    нужно проигнорировать (несколько диапазонов, мусор), и ``False``,
+    если диапазон невыполним.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — последние N байт
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, last_modified):
+    """Проверяет If-Range: диапазон отдается, только если файл не менялся"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve_protected(request, field_file):
+    """Отдает файл ``field_file`` после того, как вызывающий код проверил права"""
+    path = field_file.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse(status=404)
+
+    etag = make_etag(stat)
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+        if backend == 'nginx':
+            # nginx сам обработает Range и отдаст файл из internal-локации
+            prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = prefix + quote(field_file.name)
+        elif backend == 'xsendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = file_response(request, path, stat.st_size, etag, last_modified, content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+
+    max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60 * 24 * 365)
+    # Файлы неизменяемы: новая загрузка получает новый pk и новое имя
+    response['Cache-Control'] = f'private, max-age={max_age}, immutable'
+    response['Vary'] = 'Cookie'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+def file_response(request, path, size, etag, last_modified, content_type):
+    """FileResponse с поддержкой одиночного диапазона Range"""
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(open(path, 'rb'), start, length), content_type=content_type, status=206)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,17 @@
+from django.utils import timezone
+
+from .models import UserProfile
+
+
+class UserTimezoneMiddleware:
+    """Включает часовой пояс пользователя из профиля на время запроса"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            timezone.activate(UserProfile.timezone_for(request.user.pk))
+        else:
+            timezone.deactivate()
+        return self.get_response(request)
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:55
+
+import diary_app.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0002_entryimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedContent',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archived_content', serialize=False, to='diary_app.diaryentry', verbose_name='Запись')),
+                ('content', diary_app.fields.CompressedTextField(verbose_name='Содержание')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+            ],
+            options={
+                'verbose_name': 'Архивный текст записи',
+                'verbose_name_plural': 'Архивные тексты записей',
+            },
+        ),
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(verbose_name='Словарь')),
+                ('sample_size', models.PositiveIntegerField(default=0, verbose_name='Записей в выборке')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Словарь сжатия',
+                'verbose_name_plural': 'Словари сжатия',
+            },
+        ),
+        migrations.AddField(
+            model_name='diaryentry',
+            name='is_archived',
+            field=models.BooleanField(default=False, editable=False, verbose_name='В архиве'),
+        ),
+    ]
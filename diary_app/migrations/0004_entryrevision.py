@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:56
+
+import diary_app.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0003_entry_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер версии')),
+                ('kind', models.CharField(choices=[('snapshot', 'Снимок'), ('delta', 'Дельта')], max_length=10, verbose_name='Тип')),
+                ('title', models.CharField(blank=True, max_length=200, verbose_name='Заголовок')),
+                ('mood', models.CharField(blank=True, max_length=20, null=True, verbose_name='Настроение')),
+                ('tags', models.CharField(blank=True, max_length=255, verbose_name='Теги')),
+                ('data', diary_app.fields.CompressedTextField(verbose_name='Данные')),
+                ('content_hash', models.CharField(max_length=40, verbose_name='Хэш состояния')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата версии')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='diary_app.diaryentry', verbose_name='Запись')),
+            ],
+            options={
+                'verbose_name': 'Версия записи',
+                'verbose_name_plural': 'Версии записей',
+                'ordering': ['-number'],
+                'constraints': [models.UniqueConstraint(fields=('entry', 'number'), name='unique_entry_revision_number')],
+            },
+        ),
+    ]
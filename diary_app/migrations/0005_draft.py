@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0004_entryrevision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Draft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=200, verbose_name='Заголовок')),
+                ('content', models.TextField(blank=True, verbose_name='Содержание')),
+                ('mood', models.CharField(blank=True, max_length=20, verbose_name='Настроение')),
+                ('tags', models.CharField(blank=True, max_length=255, verbose_name='Теги')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата сохранения')),
+                ('entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='drafts', to='diary_app.diaryentry', verbose_name='Запись')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drafts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Черновик',
+                'verbose_name_plural': 'Черновики',
+                'constraints': [models.UniqueConstraint(fields=('user', 'entry'), name='unique_entry_draft'), models.UniqueConstraint(condition=models.Q(('entry__isnull', True)), fields=('user',), name='unique_new_entry_draft')],
+            },
+        ),
+    ]
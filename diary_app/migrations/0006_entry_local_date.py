@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:58
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def backfill_local_dates(apps, schema_editor):
+    """Заполняет local_date и month_day пачками, не загружая тексты записей"""
+    DiaryEntry = apps.get_model('diary_app', 'DiaryEntry')
+    last_pk = 0
+    while True:
+        batch = list(
+            DiaryEntry.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'created_at')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for entry in batch:
+            local = timezone.localtime(entry.created_at)
+            entry.local_date = local.date()
+            entry.month_day = local.month * 100 + local.day
+        DiaryEntry.objects.bulk_update(batch, ['local_date', 'month_day'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0005_draft'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diaryentry',
+            name='local_date',
+            field=models.DateField(editable=False, null=True, verbose_name='Локальная дата'),
+        ),
+        migrations.AddField(
+            model_name='diaryentry',
+            name='month_day',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='День года'),
+        ),
+        migrations.AlterField(
+            model_name='diaryentry',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата создания'),
+        ),
+        migrations.RunPython(backfill_local_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='diaryentry',
+            index=models.Index(fields=['user', 'month_day', '-local_date'], name='diary_app_d_user_id_ce2f1d_idx'),
+        ),
+    ]
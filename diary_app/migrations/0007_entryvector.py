@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0006_entry_local_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryVector',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='diary_app.diaryentry', verbose_name='Запись')),
+                ('vector', models.BinaryField(verbose_name='Вектор')),
+            ],
+            options={
+                'verbose_name': 'Вектор записи',
+                'verbose_name_plural': 'Векторы записей',
+            },
+        ),
+    ]
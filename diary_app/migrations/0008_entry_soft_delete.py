@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0007_entryvector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diaryentry',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата удаления'),
+        ),
+        migrations.AddIndex(
+            model_name='diaryentry',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='diary_entry_deleted_at'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0008_entry_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='time_zone',
+            field=models.CharField(blank=True, max_length=63, verbose_name='Часовой пояс'),
+        ),
+        migrations.AddIndex(
+            model_name='diaryentry',
+            index=models.Index(fields=['user', 'local_date'], name='diary_app_d_user_id_b8dc5d_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0009_user_time_zone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diaryentry',
+            index=models.Index(fields=['user', 'mood', '-created_at'], name='diary_entry_user_mood'),
+        ),
+        migrations.AddIndex(
+            model_name='diaryentry',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('is_favorite', True)), fields=['user', '-created_at'], name='diary_entry_user_favorites'),
+        ),
+        migrations.AddIndex(
+            model_name='diaryentry',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('is_favorite', True)), fields=['user', 'mood', '-created_at'], name='diary_entry_user_mood_fav'),
+        ),
+    ]
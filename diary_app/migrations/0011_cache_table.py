@@ -0,0 +1,18 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Таблица для DatabaseCache из CACHES; для других бэкендов ничего не делает
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0010_diary_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
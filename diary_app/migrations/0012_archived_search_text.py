@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:21
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 200
+
+
+def search_words(text):
+    # Копия diary_app.models.search_words на момент миграции: изменение
+    # функции в приложении не должно менять то, что делает эта миграция
+    return ' '.join(sorted(set(re.findall(r'\w+', text.lower()))))
+
+
+def backfill_search_text(apps, schema_editor):
+    """Заполняет слова для поиска у уже заархивированных записей"""
+    ArchivedContent = apps.get_model('diary_app', 'ArchivedContent')
+    last_pk = 0
+    while True:
+        batch = list(ArchivedContent.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        for archived in batch:
+            archived.search_text = search_words(archived.content)
+        ArchivedContent.objects.bulk_update(batch, ['search_text'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary_app', '0011_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedcontent',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Слова для поиска'),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,13 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Кэш больше не хранится в базе (см. CACHES), таблица 0011 не нужна"""
+
+    dependencies = [
+        ('diary_app', '0012_archived_search_text'),
+    ]
+
+    operations = [
+        migrations.RunSQL('DROP TABLE IF EXISTS memind_cache', migrations.RunSQL.noop),
+    ]
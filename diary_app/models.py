@@ -1,15 +1,85 @@
-from django.db import models
+import re
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
+from .fields import CompressedTextField
+from .timezones import cache_key as timezone_cache_key, get_timezone
+
+
+class DiaryEntryQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """Помечает записи удаленными одним UPDATE.
+        
+        Строки, фотографии и файлы удаляет позже purge_deleted_entries.
+        """
+        return self.update(deleted_at=timezone.now())
+    
+    def restore(self):
+        return self.update(deleted_at=None)
+    
+    def apply_filters(self, search='', mood='', favorite=False):
+        """Фильтры списка записей (diary_view, check_query_plans)"""
+        entries = self
+        if search:
+            condition = (
+                models.Q(title__icontains=search) |
+                models.Q(content__icontains=search) |
+                models.Q(tags__icontains=search)
+            )
+            # В content архивной записи только начало, полный текст сжат;
+            # ищем по словам из ArchivedContent.search_text
+            words = search_words(search).split()
+            if words:
+                archived = models.Q(is_archived=True)
+                for word in words:
+                    archived &= models.Q(archived_content__search_text__contains=word)
+                condition |= archived
+            entries = entries.filter(condition)
+        if mood:
+            entries = entries.filter(mood=mood)
+        if favorite:
+            entries = entries.filter(is_favorite=True)
+        return entries
+    
+    def refresh_local_dates(self, zone, batch_size=1000):
+        """Пересчитывает local_date и month_day в поясе ``zone``.
+        
+        Пишутся только изменившиеся строки, возвращает их число.
+        """
+        changed = []
+        with transaction.atomic():
+            for entry in self.only('pk', 'created_at', 'local_date', 'month_day').order_by('pk'):
+                previous = (entry.local_date, entry.month_day)
+                entry.set_local_date(zone)
+                if (entry.local_date, entry.month_day) != previous:
+                    changed.append(entry)
+            self.model.all_objects.bulk_update(changed, ['local_date', 'month_day'], batch_size=batch_size)
+        return len(changed)
+
+
+class DiaryEntryManager(models.Manager.from_queryset(DiaryEntryQuerySet)):
+    """Менеджер по умолчанию: удаленные записи не видны"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class DiaryEntry(models.Model):
     """Модель записи в дневнике"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='diary_entries', verbose_name='Пользователь')
     title = models.CharField(max_length=200, verbose_name='Заголовок', blank=True)
+    # Не сжимается: по тексту ищут через LIKE в SQL, а сжатые данные так не
+    # найти. Сжимается только полный текст холодных записей (ArchivedContent)
     content = models.TextField(verbose_name='Содержание')
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    # Локальная дата создания и день года (месяц * 100 + день) для запросов по датам
+    local_date = models.DateField(null=True, editable=False, verbose_name='Локальная дата')
+    month_day = models.PositiveSmallIntegerField(null=True, editable=False, verbose_name='День года')
     mood = models.CharField(
         max_length=20,
         choices=[
@@ -28,6 +98,13 @@ class DiaryEntry(models.Model):
     )
     tags = models.CharField(max_length=255, blank=True, verbose_name='Теги (через запятую)')
     is_favorite = models.BooleanField(default=False, verbose_name='Избранное')
+    # Полный текст архивной записи лежит в ArchivedContent, в content - только начало
+    is_archived = models.BooleanField(default=False, editable=False, verbose_name='В архиве')
+    # Удаленная запись скрыта до окончательного удаления (см. purge_deleted_entries)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Дата удаления')
+    
+    objects = DiaryEntryManager()
+    all_objects = DiaryEntryQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Запись дневника'
@@ -36,11 +113,38 @@ class DiaryEntry(models.Model):
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', 'local_date']),
+            models.Index(fields=['user', 'month_day', '-local_date']),
+            # Фильтры diary_view; проверяются командой check_query_plans
+            models.Index(fields=['user', 'mood', '-created_at'], name='diary_entry_user_mood'),
+            models.Index(
+                fields=['user', '-created_at'],
+                name='diary_entry_user_favorites',
+                condition=models.Q(is_favorite=True, deleted_at__isnull=True),
+            ),
+            models.Index(
+                fields=['user', 'mood', '-created_at'],
+                name='diary_entry_user_mood_fav',
+                condition=models.Q(is_favorite=True, deleted_at__isnull=True),
+            ),
+            models.Index(
+                fields=['deleted_at'],
+                name='diary_entry_deleted_at',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
         ]
     
     def __str__(self):
         return f"{self.user.username} - {self.created_at.strftime('%d.%m.%Y')}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Теги на момент загрузки: индекс тегов обновляется на разницу
+        if 'tags' in field_names:
+            instance._loaded_tags = instance.tags
+        return instance
+    
     def get_absolute_url(self):
         return reverse('entry_detail', kwargs={'pk': self.pk})
     
@@ -49,6 +153,34 @@ class DiaryEntry(models.Model):
         if self.tags:
             return [tag.strip() for tag in self.tags.split(',')]
         return []
+    
+    def set_local_date(self, zone=None):
+        """Заполняет local_date и month_day по времени создания в поясе владельца"""
+        if zone is None:
+            zone = UserProfile.timezone_for(self.user_id)
+        local = timezone.localtime(self.created_at, zone)
+        self.local_date = local.date()
+        self.month_day = local.month * 100 + local.day
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'created_at' in update_fields:
+            self.set_local_date()
+        super().save(*args, **kwargs)
+        if getattr(self, '_restored_from_archive', False):
+            # Полный текст снова хранится в самой записи
+            ArchivedContent.objects.filter(entry=self).delete()
+            self._restored_from_archive = False
+    
+    def load_content(self):
+        """Подставляет в content полный текст архивной записи.
+        
+        После save() запись перестает быть архивной.
+        """
+        if self.is_archived:
+            self.content = self.archived_content.content
+            self.is_archived = False
+            self._restored_from_archive = True
 
 
 class EntryImage(models.Model):
@@ -65,6 +197,10 @@ class EntryImage(models.Model):
     
     def __str__(self):
         return f"Изображение для записи {self.entry.pk}"
+    
+    def get_absolute_url(self):
+        """URL защищенной отдачи файла (см. views.image_serve)"""
+        return reverse('image_serve', kwargs={'pk': self.pk})
 
 
 class UserProfile(models.Model):
@@ -73,6 +209,8 @@ class UserProfile(models.Model):
     bio = models.TextField(max_length=500, blank=True, verbose_name='О себе')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name='Аватар')
     birth_date = models.DateField(blank=True, null=True, verbose_name='Дата рождения')
+    # Имя пояса из базы IANA; пустое - TIME_ZONE сервера
+    time_zone = models.CharField(max_length=63, blank=True, verbose_name='Часовой пояс')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата регистрации')
     
     class Meta:
@@ -81,4 +219,152 @@ class UserProfile(models.Model):
     
     def __str__(self):
         return f"Профиль {self.user.username}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Пояс на момент загрузки: при смене пересчитываются даты записей
+        if 'time_zone' in field_names:
+            instance._loaded_time_zone = instance.time_zone
+        return instance
+    
+    @classmethod
+    def timezone_for(cls, user_id):
+        """Часовой пояс пользователя.
+        
+        Имя кэшируется в общем кэше; при смене пояса ключ удаляется, а срок
+        жизни ограничивает устаревание, если удаление не дошло до кэша.
+        """
+        key = timezone_cache_key(user_id)
+        name = cache.get(key)
+        if name is None:
+            name = cls.objects.filter(user_id=user_id).values_list('time_zone', flat=True).first() or ''
+            cache.set(key, name, getattr(settings, 'DIARY_TIMEZONE_CACHE_TIMEOUT', 60 * 5))
+        return get_timezone(name)
+
 
+
+class CompressionDictionary(models.Model):
+    """Словарь zlib, обученный на текстах записей"""
+    data = models.BinaryField(verbose_name='Словарь')
+    sample_size = models.PositiveIntegerField(default=0, verbose_name='Записей в выборке')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    
+    class Meta:
+        verbose_name = 'Словарь сжатия'
+        verbose_name_plural = 'Словари сжатия'
+    
+    def __str__(self):
+        return f"Словарь {self.pk} ({len(self.data)} байт)"
+
+
+def search_words(text):
+    """Уникальные слова текста в нижнем регистре через пробел"""
+    return ' '.join(sorted(set(re.findall(r'\w+', text.lower()))))
+
+
+class ArchivedContent(models.Model):
+    """Сжатый полный текст давно не открывавшейся записи"""
+    entry = models.OneToOneField(
+        DiaryEntry,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='archived_content',
+        verbose_name='Запись'
+    )
+    content = CompressedTextField(verbose_name='Содержание')
+    # Словарь текста без повторов - по нему записи из архива находит поиск
+    search_text = models.TextField(blank=True, editable=False, verbose_name='Слова для поиска')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+    
+    class Meta:
+        verbose_name = 'Архивный текст записи'
+        verbose_name_plural = 'Архивные тексты записей'
+    
+    def __str__(self):
+        return f"Архив записи {self.entry_id}"
+
+
+class EntryRevision(models.Model):
+    """Версия записи: полный снимок текста или дельта от предыдущей версии"""
+    KIND_SNAPSHOT = 'snapshot'
+    KIND_DELTA = 'delta'
+    
+    entry = models.ForeignKey(DiaryEntry, on_delete=models.CASCADE, related_name='revisions', verbose_name='Запись')
+    number = models.PositiveIntegerField(verbose_name='Номер версии')
+    kind = models.CharField(
+        max_length=10,
+        choices=[(KIND_SNAPSHOT, 'Снимок'), (KIND_DELTA, 'Дельта')],
+        verbose_name='Тип'
+    )
+    title = models.CharField(max_length=200, blank=True, verbose_name='Заголовок')
+    mood = models.CharField(max_length=20, blank=True, null=True, verbose_name='Настроение')
+    tags = models.CharField(max_length=255, blank=True, verbose_name='Теги')
+    # Полный текст (снимок) или JSON дельты, см. revisions.py
+    data = CompressedTextField(verbose_name='Данные')
+    content_hash = models.CharField(max_length=40, verbose_name='Хэш состояния')
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата версии')
+    
+    class Meta:
+        verbose_name = 'Версия записи'
+        verbose_name_plural = 'Версии записей'
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'number'], name='unique_entry_revision_number'),
+        ]
+    
+    def __str__(self):
+        return f"Версия {self.number} записи {self.entry_id}"
+
+
+class Draft(models.Model):
+    """Автосохраненный черновик записи (новой или редактируемой)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='drafts', verbose_name='Пользователь')
+    entry = models.ForeignKey(
+        DiaryEntry,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='drafts',
+        verbose_name='Запись'
+    )
+    title = models.CharField(max_length=200, blank=True, verbose_name='Заголовок')
+    content = models.TextField(blank=True, verbose_name='Содержание')
+    mood = models.CharField(max_length=20, blank=True, verbose_name='Настроение')
+    tags = models.CharField(max_length=255, blank=True, verbose_name='Теги')
+    version = models.PositiveIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата сохранения')
+    
+    class Meta:
+        verbose_name = 'Черновик'
+        verbose_name_plural = 'Черновики'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'entry'], name='unique_entry_draft'),
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(entry__isnull=True),
+                name='unique_new_entry_draft'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Черновик {self.user.username} ({self.entry_id or 'новая запись'})"
+
+
+class EntryVector(models.Model):
+    """Вектор признаков записи для поиска похожих (см. similarity.py)"""
+    entry = models.OneToOneField(
+        DiaryEntry,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='vector',
+        verbose_name='Запись'
+    )
+    vector = models.BinaryField(verbose_name='Вектор')
+    
+    class Meta:
+        verbose_name = 'Вектор записи'
+        verbose_name_plural = 'Векторы записей'
+    
+    def __str__(self):
+        return f"Вектор записи {self.entry_id}"
@@ -0,0 +1,96 @@
+"""
+Проверка планов запросов diary_view.
+
+Для каждого сочетания фильтров списка (поиск, настроение, избранное) и
+для запросов статистики страницы строится EXPLAIN QUERY PLAN. Запрос
+считается плохим, если он просматривает таблицу целиком, отбирает строки
+по индексу без столбцов своего фильтра (то есть читает всю историю
+пользователя) или сортирует найденные строки ради одной страницы.
+
+Используется тестами (diary_app/tests.py) и командой check_query_plans.
+Разбор планов реализован для SQLite.
+"""
+import re
+from datetime import date
+from itertools import product
+
+from django.db import connection
+
+from .models import DiaryEntry, EntryImage
+
+# Полный просмотр таблицы или всего индекса
+FULL_SCAN = re.compile(r'\bSCAN (diary_app_\w+)')
+# Поиск по индексу: таблица, индекс, условия ключа
+SEARCH = re.compile(r'\bSEARCH (diary_app_\w+) USING (?:COVERING )?INDEX (\w+) \(([^)]*)\)')
+# Сортировка всех найденных строк ради одной страницы
+SORT = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY')
+
+# Даты для запросов по дням: обычный день и 28 февраля невисокосного
+# года, когда "В этот день" ищет еще и записи за 29 февраля. Даты
+# фиксированы, чтобы результат не зависел от того, когда идет проверка
+DAYS = (date(2027, 3, 15), date(2027, 2, 28))
+
+
+def diary_queries():
+    """``(название, queryset, таблица, столбцы для отбора по индексу, нужен ли порядок из индекса)``
+
+    Запросы строятся так же, как в diary_view.
+    """
+    from .views import on_this_day_queries
+
+    entries_table = DiaryEntry._meta.db_table
+    # Значения не влияют на план, важно только наличие фильтра
+    user_id = 0
+    entries = DiaryEntry.objects.filter(user_id=user_id)
+    for search, mood, favorite in product(('', 'текст'), ('', 'happy'), (False, True)):
+        filtered = entries.apply_filters(search, mood, favorite)
+        # Поиск по подстроке индексом не ускоряется, остальные фильтры - должны
+        columns = {'user_id'} | ({'mood'} if mood else set()) | ({'is_favorite'} if favorite else set())
+        name = f'search={bool(search)} mood={bool(mood)} favorite={favorite}'
+        yield f'Страница ({name})', filtered[:10], entries_table, columns, True
+        yield f'Число записей ({name})', filtered.order_by(), entries_table, columns, False
+    yield (
+        'Фотографии страницы', EntryImage.objects.filter(entry_id__in=[1, 2]),
+        EntryImage._meta.db_table, {'entry_id'}, False,
+    )
+
+    yield 'Всего записей', entries.order_by(), entries_table, {'user_id'}, False
+    yield 'Избранных', entries.filter(is_favorite=True).order_by(), entries_table, {'user_id', 'is_favorite'}, False
+    for today in DAYS:
+        day = today.strftime('%d.%m.%Y')
+        yield f'Сегодня ({day})', entries.filter(local_date=today).order_by(), entries_table, {'user_id', 'local_date'}, False
+        for queryset in on_this_day_queries(user_id, today):
+            yield f'В этот день ({day})', queryset, entries_table, {'user_id', 'month_day'}, True
+
+
+def partial_columns(index):
+    """Столбцы из условия WHERE частичного индекса"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = %s", [index])
+        row = cursor.fetchone()
+    if not row or not row[0] or ' WHERE ' not in row[0]:
+        return set()
+    return set(re.findall(r'"(\w+)"', row[0].split(' WHERE ', 1)[1]))
+
+
+def plan_problems(plan, table, columns, ordered):
+    """Претензии к плану запроса (пустой список - план хороший)"""
+    problems = [f'полный просмотр {scanned}' for scanned in FULL_SCAN.findall(plan)]
+    for searched, index, constraints in SEARCH.findall(plan):
+        if searched != table:
+            # Присоединенные таблицы (архив записи) ищутся по ключу записи
+            continue
+        covered = set(re.findall(r'(\w+)\s*(?:=|>|<|IN\b)', constraints)) | partial_columns(index)
+        missing = columns - covered
+        if missing:
+            problems.append(f'индекс {index} не отбирает по {", ".join(sorted(missing))}')
+    if ordered and SORT.search(plan):
+        problems.append('сортировка вместо порядка индекса')
+    return problems
+
+
+def check_diary_queries():
+    """``(название, план, претензии)`` для каждого запроса diary_view"""
+    for name, queryset, table, columns, ordered in diary_queries():
+        plan = queryset.explain()
+        yield name, plan, plan_problems(plan, table, columns, ordered)
@@ -0,0 +1,258 @@
+"""
+История изменений записей.
+
+Каждая версия хранится либо полным снимком текста, либо дельтой от
+предыдущей версии (замененные абзацы, а внутри измененного абзаца -
+замененные слова, чтобы правка в длинном абзаце не сохраняла его
+целиком). Полный снимок делается раз в
+DIARY_REVISION_SNAPSHOT_EVERY версий, поэтому для восстановления любой
+версии нужно применить не больше этого числа дельт, а место растет
+пропорционально объему правок, а не длине записи.
+"""
+import hashlib
+import json
+import os
+import re
+from difflib import SequenceMatcher, unified_diff
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import EntryRevision
+
+
+def snapshot_every():
+    return getattr(settings, 'DIARY_REVISION_SNAPSHOT_EVERY', 10)
+
+
+# Слова и промежутки между ними; вместе дают исходную строку
+WORDS = re.compile(r'\s+|\S+')
+
+
+def make_word_delta(old, new):
+    """Дельта внутри абзаца: список ``[начало, конец, новый текст]`` в символах"""
+    # Общие начало и конец отрезаются сразу: обычно правка - несколько
+    # слов посередине или дописанный конец
+    prefix = len(os.path.commonprefix([old, new]))
+    suffix = 0
+    limit = min(len(old), len(new)) - prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    a = WORDS.findall(old[prefix:len(old) - suffix])
+    b = WORDS.findall(new[prefix:len(new) - suffix])
+    offsets = [prefix]
+    for word in a:
+        offsets.append(offsets[-1] + len(word))
+    matcher = SequenceMatcher(None, a, b)
+    return [
+        [offsets[i1], offsets[i2], ''.join(b[j1:j2])]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_word_delta(old, delta):
+    parts = []
+    position = 0
+    for start, end, text in delta:
+        parts.append(old[position:start])
+        parts.append(text)
+        position = end
+    parts.append(old[position:])
+    return ''.join(parts)
+
+
+def make_delta(old, new):
+    """Дельта по абзацам: список ``[начало, конец, замена]``.
+
+    Замена - новый текст абзацев или, если так короче, дельта по словам
+    (make_word_delta) для замененных абзацев.
+    """
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    delta = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        text = ''.join(b[j1:j2])
+        if tag == 'replace':
+            words = make_word_delta(''.join(a[i1:i2]), text)
+            if len(json.dumps(words, ensure_ascii=False)) < len(text):
+                delta.append([i1, i2, words])
+                continue
+        delta.append([i1, i2, text])
+    return delta
+
+
+def apply_delta(old, delta):
+    """Применяет дельту make_delta к тексту"""
+    a = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+    for start, end, replacement in delta:
+        parts.extend(a[position:start])
+        if isinstance(replacement, str):
+            parts.append(replacement)
+        else:
+            parts.append(apply_word_delta(''.join(a[start:end]), replacement))
+        position = end
+    parts.extend(a[position:])
+    return ''.join(parts)
+
+
+def state_hash(title, mood, tags, content):
+    data = '\0'.join([title, mood or '', tags, content])
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def chain_from_snapshot(entry, number=None):
+    """Ревизии от ближайшего снимка до ``number`` (или до последней) по возрастанию"""
+    revisions = entry.revisions.all()
+    if number is not None:
+        revisions = revisions.filter(number__lte=number)
+    snapshot_number = (
+        revisions.filter(kind=EntryRevision.KIND_SNAPSHOT)
+        .order_by('-number')
+        .values_list('number', flat=True)
+        .first()
+    )
+    if snapshot_number is None:
+        return []
+    return list(revisions.filter(number__gte=snapshot_number).order_by('number'))
+
+
+def replay(chain):
+    """Текст последней ревизии цепочки, начинающейся со снимка"""
+    content = ''
+    for revision in chain:
+        if revision.kind == EntryRevision.KIND_SNAPSHOT:
+            content = revision.data
+        else:
+            content = apply_delta(content, json.loads(revision.data))
+    return content
+
+
+def get_revision_content(entry, number):
+    """Текст записи в версии ``number``"""
+    chain = chain_from_snapshot(entry, number)
+    if not chain or chain[-1].number != number:
+        raise EntryRevision.DoesNotExist
+    return replay(chain)
+
+
+def record_revision(entry):
+    """Сохраняет текущее состояние записи как новую версию.
+
+    Ничего не делает, если запись не изменилась с последней версии.
+    ``entry.content`` должен содержать полный текст (см. load_content).
+    """
+    content_hash = state_hash(entry.title, entry.mood, entry.tags, entry.content)
+    latest = entry.revisions.order_by('-number').only('number', 'content_hash').first()
+    if latest is not None and latest.content_hash == content_hash:
+        return None
+
+    revision = EntryRevision(
+        entry=entry,
+        number=latest.number + 1 if latest else 1,
+        title=entry.title,
+        mood=entry.mood,
+        tags=entry.tags,
+        content_hash=content_hash,
+    )
+    chain = chain_from_snapshot(entry) if latest else []
+    if chain and len(chain) < snapshot_every():
+        delta = json.dumps(make_delta(replay(chain), entry.content), ensure_ascii=False)
+        # Если правка почти целиком переписала текст, дешевле хранить снимок
+        if len(delta) < len(entry.content) // 2:
+            revision.kind = EntryRevision.KIND_DELTA
+            revision.data = delta
+    if not revision.data:
+        revision.kind = EntryRevision.KIND_SNAPSHOT
+        revision.data = entry.content
+    revision.save()
+    return revision
+
+
+def revisions_to_keep(revisions, keep_recent, keep_daily_days, now):
+    """Номера версий, которые переживут очистку.
+
+    Последние ``keep_recent`` версий сохраняются всегда, за последние
+    ``keep_daily_days`` дней - последняя версия каждого дня, старше -
+    последняя версия каждого месяца.
+    """
+    # revisions[-0:] - это весь список, поэтому ноль обрабатывается отдельно
+    recent = revisions[-keep_recent:] if keep_recent > 0 else []
+    keep = {revision.number for revision in recent}
+    buckets = {}
+    for revision in revisions:
+        created = revision.created_at
+        if (now - created).days < keep_daily_days:
+            bucket = created.date()
+        else:
+            bucket = (created.year, created.month)
+        buckets[bucket] = revision.number
+    keep.update(buckets.values())
+    return keep
+
+
+@transaction.atomic
+def prune_revisions(entry, keep_recent, keep_daily_days, now):
+    """Удаляет лишние версии и пересобирает цепочку дельт.
+
+    Возвращает число удаленных версий.
+    """
+    revisions = list(entry.revisions.order_by('number'))
+    keep = revisions_to_keep(revisions, keep_recent, keep_daily_days, now)
+    if len(keep) == len(revisions):
+        return 0
+
+    rebuilt = []
+    content = ''
+    previous_content = None
+    since_snapshot = 0
+    for revision in revisions:
+        if revision.kind == EntryRevision.KIND_SNAPSHOT:
+            content = revision.data
+        else:
+            content = apply_delta(content, json.loads(revision.data))
+        if revision.number not in keep:
+            continue
+
+        delta = None
+        if previous_content is not None and since_snapshot < snapshot_every():
+            delta = json.dumps(make_delta(previous_content, content), ensure_ascii=False)
+            if len(delta) >= len(content) // 2:
+                delta = None
+        if delta is None:
+            revision.kind = EntryRevision.KIND_SNAPSHOT
+            revision.data = content
+            since_snapshot = 1
+        else:
+            revision.kind = EntryRevision.KIND_DELTA
+            revision.data = delta
+            since_snapshot += 1
+        previous_content = content
+        rebuilt.append(revision)
+
+    entry.revisions.all().delete()
+    EntryRevision.objects.bulk_create(rebuilt)
+    return len(revisions) - len(rebuilt)
+
+
+def diff_lines(old, new):
+    """Построчный diff для шаблона: список ``(тип, строка)``"""
+    lines = []
+    diff = unified_diff(old.splitlines(), new.splitlines(), lineterm='', n=2)
+    for line in diff:
+        if line.startswith(('---', '+++')):
+            continue
+        if line.startswith('@@'):
+            lines.append(('hunk', '…'))
+        elif line.startswith('+'):
+            lines.append(('added', line[1:]))
+        elif line.startswith('-'):
+            lines.append(('removed', line[1:]))
+        else:
+            lines.append(('context', line[1:]))
+    return lines
@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django.core.cache import cache
+from .models import UserProfile, DiaryEntry
+from . import similarity
+from .tags import update_tag_index
+from .timezones import cache_key as timezone_cache_key, get_timezone
+
+# Поля записи, от которых зависит вектор похожих записей
+SIMILARITY_FIELDS = {'title', 'content', 'tags'}
 
 
 @receiver(post_save, sender=User)
@@ -19,3 +26,50 @@ def save_user_profile(sender, instance, **kwargs):
     else:
         UserProfile.objects.get_or_create(user=instance)
 
+
+@receiver(post_save, sender=UserProfile)
+def update_entry_local_dates(sender, instance, update_fields=None, **kwargs):
+    """Пересчитывает локальные даты записей после смены часового пояса"""
+    if update_fields is not None and 'time_zone' not in update_fields:
+        return
+    if instance.time_zone == getattr(instance, '_loaded_time_zone', ''):
+        return
+    cache.delete(timezone_cache_key(instance.user_id))
+    # Включая удаленные: их можно восстановить
+    entries = DiaryEntry.all_objects.filter(user_id=instance.user_id)
+    entries.refresh_local_dates(get_timezone(instance.time_zone))
+    instance._loaded_time_zone = instance.time_zone
+
+
+@receiver(post_save, sender=DiaryEntry)
+def update_entry_similarity(sender, instance, update_fields=None, **kwargs):
+    """Обновляет вектор записи в индексе похожих записей"""
+    if update_fields is not None and not SIMILARITY_FIELDS & set(update_fields):
+        return
+    similarity.update_entry(instance)
+
+
+@receiver(post_delete, sender=DiaryEntry)
+def remove_entry_similarity(sender, instance, **kwargs):
+    """Убирает удаленную запись из индекса похожих записей"""
+    if instance.deleted_at is not None:
+        # Запись убрана из индексов еще при мягком удалении
+        return
+    similarity.remove_entry(instance.user_id, instance.pk)
+
+
+@receiver(post_save, sender=DiaryEntry)
+def update_entry_tags(sender, instance, update_fields=None, **kwargs):
+    """Обновляет индекс автодополнения тегов на разницу тегов записи"""
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    update_tag_index(instance.user_id, getattr(instance, '_loaded_tags', ''), instance.tags)
+    instance._loaded_tags = instance.tags
+
+
+@receiver(post_delete, sender=DiaryEntry)
+def remove_entry_tags(sender, instance, **kwargs):
+    """Убирает теги удаленной записи из индекса автодополнения"""
+    if instance.deleted_at is not None:
+        return
+    update_tag_index(instance.user_id, instance.tags, '')
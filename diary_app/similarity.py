@@ -0,0 +1,250 @@
+"""
+Похожие записи.
+
+Каждая запись превращается в хэшированный мешок слов фиксированной
+размерности (заголовок, текст и теги с разными весами) и хранится в
+EntryVector. Для поиска все векторы пользователя держатся в памяти
+процесса одной матрицей NumPy в float16 (вдвое меньше float32); в
+float32 для BLAS переводятся только блоки строк на время запроса.
+Индексы пользователей вытесняются по суммарному размеру
+(DIARY_SIMILAR_CACHE_BYTES), а не по их числу. При сохранении и удалении записи
+матрица обновляется на месте, а другие процессы узнают об изменении
+по версии в кэше и перечитывают векторы при следующем запросе. Поэтому
+кэш должен быть общим для всех воркеров (см. CACHES в settings).
+Косинусная близость считается с весами TF-IDF по частотам признаков
+внутри дневника пользователя.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import DiaryEntry, EntryVector
+from .vectors import VECTOR_DTYPE, vectorize, vectorize_rows
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+# Строк матрицы, переводимых в float32 за раз: временная копия
+# ограничена BLOCK_ROWS * размерность * 4 байта
+BLOCK_ROWS = 4096
+
+
+def dimensions():
+    return getattr(settings, 'DIARY_SIMILAR_DIMENSIONS', 512)
+
+
+def cache_bytes():
+    return getattr(settings, 'DIARY_SIMILAR_CACHE_BYTES', 256 * 1024 * 1024)
+
+
+def entry_text(entry):
+    """Полный текст записи, в том числе архивной"""
+    if entry.is_archived:
+        return entry.archived_content.content
+    return entry.content
+
+
+def version_key(user_id):
+    return f'similarity:{user_id}'
+
+
+def current_version(user_id):
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Ключ вытеснен или кэш очищен: берем значение, которого не было
+        # ни у одного индекса, иначе старый индекс сошел бы за актуальный
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    try:
+        return cache.incr(version_key(user_id))
+    except ValueError:
+        return current_version(user_id)
+
+
+class UserIndex:
+    """Матрица векторов записей одного пользователя"""
+
+    def __init__(self, ids, matrix, version):
+        self.ids = ids
+        self.matrix = matrix.astype(VECTOR_DTYPE, copy=False)
+        self.version = version
+        self.rows = {int(pk): row for row, pk in enumerate(ids)}
+        self.df = np.count_nonzero(self.matrix, axis=0).astype(np.int32)
+        self.norms = None
+
+    @classmethod
+    def load(cls, user_id, version):
+        size = dimensions()
+        ids = []
+        vectors = []
+        rows = (
+            EntryVector.objects
+            .filter(entry__user_id=user_id, entry__deleted_at__isnull=True)
+            .values_list('entry_id', 'vector')
+        )
+        for pk, vector in rows:
+            vector = np.frombuffer(bytes(vector), dtype=VECTOR_DTYPE)
+            if vector.size == size:
+                ids.append(pk)
+                vectors.append(vector)
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, size), dtype=VECTOR_DTYPE)
+        return cls(np.array(ids, dtype=np.int64), matrix, version)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.matrix.nbytes
+
+    def blocks(self):
+        """``(начало, строки в float32)`` блоками по BLOCK_ROWS"""
+        for start in range(0, len(self.ids), BLOCK_ROWS):
+            yield start, self.matrix[start:start + BLOCK_ROWS].astype(np.float32)
+
+    def put(self, pk, vector):
+        vector = vector.astype(VECTOR_DTYPE)
+        row = self.rows.get(pk)
+        if row is None:
+            self.rows[pk] = len(self.ids)
+            self.ids = np.append(self.ids, pk)
+            self.matrix = np.vstack([self.matrix, vector])
+        else:
+            self.df -= self.matrix[row] != 0
+            self.matrix[row] = vector
+        self.df += vector != 0
+        self.norms = None
+
+    def remove(self, pk):
+        row = self.rows.pop(pk, None)
+        if row is None:
+            return
+        self.df -= self.matrix[row] != 0
+        self.ids = np.delete(self.ids, row)
+        self.matrix = np.delete(self.matrix, row, axis=0)
+        self.rows = {int(pk): row for row, pk in enumerate(self.ids)}
+        self.norms = None
+
+    def weights(self):
+        """Квадраты весов IDF и нормы строк с этими весами (кэшируются до изменения)"""
+        if self.norms is None:
+            idf = np.log((len(self.ids) + 1) / (self.df + 1)).astype(np.float32) + 1
+            self.idf_squared = idf * idf
+            norms = np.empty(len(self.ids), dtype=np.float32)
+            for start, block in self.blocks():
+                norms[start:start + len(block)] = np.einsum('ij,ij,j->i', block, block, self.idf_squared)
+            self.norms = np.sqrt(norms)
+        return self.idf_squared, self.norms
+
+    def top_k(self, pk, k):
+        """``(pk, близость)`` k самых похожих на запись ``pk``"""
+        row = self.rows.get(pk)
+        if row is None or len(self.ids) < 2:
+            return []
+        idf_squared, norms = self.weights()
+        # (M * idf) · (q * idf) = M · (q * idf²), без копии взвешенной матрицы
+        query = self.matrix[row].astype(np.float32) * idf_squared
+        dots = np.empty(len(self.ids), dtype=np.float32)
+        for start, block in self.blocks():
+            dots[start:start + len(block)] = block @ query
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(norms > 0, dots / (norms * norms[row]), 0)
+        scores[row] = -1
+        k = min(k, len(scores) - 1)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.ids[i]), float(scores[i])) for i in best]
+
+
+def get_index(user_id):
+    """Индекс пользователя из памяти процесса (перечитывается при смене версии)"""
+    version = current_version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(user_id)
+            return index
+    index = UserIndex.load(user_id, version)
+    with _lock:
+        _indexes[user_id] = index
+        evict()
+    return index
+
+
+def evict():
+    """Вытесняет давно не использованные индексы сверх DIARY_SIMILAR_CACHE_BYTES (под _lock).
+
+    Последний использованный индекс остается, даже если он один больше предела.
+    """
+    total = sum(index.nbytes for index in _indexes.values())
+    while total > cache_bytes() and len(_indexes) > 1:
+        _, index = _indexes.popitem(last=False)
+        total -= index.nbytes
+
+
+def update_entry(entry):
+    """Пересчитывает вектор записи после сохранения"""
+    vector = vectorize(entry.title, entry_text(entry), entry.tags, dimensions())
+    EntryVector.objects.update_or_create(entry_id=entry.pk, defaults={'vector': vector.tobytes()})
+    with _lock:
+        index = _indexes.get(entry.user_id)
+    previous = index.version if index is not None else None
+    version = bump_version(entry.user_id)
+    if index is not None and previous == version - 1:
+        # Индекс этого процесса был актуален - обновляем на месте
+        with _lock:
+            index.put(entry.pk, vector)
+            index.version = version
+            evict()
+
+
+def refresh_entries(user_id, pks):
+    """Пересчитывает векторы нескольких записей пользователя (после массовых изменений)"""
+    entries = (
+        DiaryEntry.objects
+        .filter(user_id=user_id, pk__in=pks)
+        .select_related('archived_content')
+        .only('pk', 'title', 'content', 'tags', 'is_archived', 'archived_content__content')
+    )
+    rows = [(entry.pk, entry.title, entry_text(entry), entry.tags) for entry in entries]
+    EntryVector.objects.bulk_create(
+        [EntryVector(entry_id=pk, vector=vector) for pk, vector in vectorize_rows(rows, dimensions())],
+        update_conflicts=True,
+        unique_fields=['entry'],
+        update_fields=['vector'],
+    )
+    # Индексы всех процессов перечитаются при следующем запросе
+    bump_version(user_id)
+
+
+def remove_entries(user_id, pks):
+    """Убирает записи из индекса после удаления"""
+    with _lock:
+        index = _indexes.get(user_id)
+    previous = index.version if index is not None else None
+    version = bump_version(user_id)
+    if index is not None and previous == version - 1:
+        with _lock:
+            for pk in pks:
+                index.remove(pk)
+            index.version = version
+
+
+def remove_entry(user_id, pk):
+    remove_entries(user_id, [pk])
+
+
+def similar_entries(entry, k=5):
+    """Похожие записи того же пользователя: список ``(pk, близость)``"""
+    min_score = getattr(settings, 'DIARY_SIMILAR_MIN_SCORE', 0.1)
+    index = get_index(entry.user_id)
+    with _lock:
+        found = index.top_k(entry.pk, k)
+    return [(pk, score) for pk, score in found if score >= min_score]
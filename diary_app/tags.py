@@ -0,0 +1,113 @@
+"""
+Автодополнение тегов.
+
+Для каждого пользователя в кэше лежит отсортированный список тегов
+(в нижнем регистре) и число записей с каждым тегом. Поиск по префиксу -
+бинарный поиск по списку, поэтому запрос на каждое нажатие клавиши не
+обращается к БД. Индекс лежит в общем для всех воркеров кэше (см. CACHES
+в settings) под ключом с версией. Если сохранение или удаление записи
+меняет ее теги, версия увеличивается атомарным cache.incr, и индекс
+строится заново при следующем запросе. Слияние разницы в уже
+построенный индекс (прочитать, изменить, записать) теряло бы изменения
+двух воркеров, сохраняющих записи одновременно.
+"""
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DiaryEntry
+
+
+def parse_tags(tags):
+    """Теги из строки через запятую (без пустых)"""
+    return [tag.strip() for tag in (tags or '').split(',') if tag.strip()]
+
+
+def version_key(user_id):
+    return f'tags-version:{user_id}'
+
+
+def current_version(user_id):
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Значение, которого не было ни у одного индекса (см. similarity)
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def cache_key(user_id, version):
+    return f'tags:{user_id}:{version}'
+
+
+def cache_timeout():
+    return getattr(settings, 'DIARY_TAG_INDEX_TIMEOUT', 60 * 60 * 24)
+
+
+def build_tag_index(user_id):
+    """Индекс тегов пользователя из БД: ``{'keys': [...], 'tags': {key: [тег, число]}}``"""
+    tags = {}
+    rows = DiaryEntry.objects.filter(user_id=user_id).exclude(tags='').values_list('tags', flat=True)
+    for value in rows.iterator():
+        for tag in parse_tags(value):
+            item = tags.setdefault(tag.lower(), [tag, 0])
+            item[1] += 1
+    return {'keys': sorted(tags), 'tags': tags}
+
+
+def get_tag_index(user_id):
+    key = cache_key(user_id, current_version(user_id))
+    index = cache.get(key)
+    if index is None:
+        # Если теги изменятся во время сборки, версия уже будет другой
+        # и индекс под этим ключом больше никто не прочитает
+        index = build_tag_index(user_id)
+        cache.set(key, index, cache_timeout())
+    return index
+
+
+def complete_tags(user_id, prefix, limit=10):
+    """Теги, начинающиеся с ``prefix``, самые частые первыми"""
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return []
+    index = get_tag_index(user_id)
+    keys = index['keys']
+    matches = []
+    position = bisect_left(keys, prefix)
+    while position < len(keys) and keys[position].startswith(prefix):
+        matches.append(index['tags'][keys[position]])
+        position += 1
+    matches.sort(key=lambda item: (-item[1], item[0]))
+    return matches[:limit]
+
+
+def update_tag_index(user_id, old_tags, new_tags):
+    """Сбрасывает индекс, если теги записи изменились"""
+    old = Counter(tag.lower() for tag in parse_tags(old_tags))
+    new = Counter(tag.lower() for tag in parse_tags(new_tags))
+    if old != new:
+        invalidate_tag_index(user_id)
+
+
+def bump_version(user_id):
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        # Версии нет - нет и индекса под ней
+        pass
+
+
+def invalidate_tag_index(user_id):
+    """Сбрасывает индекс: следующий запрос построит его по новой версии.
+
+    Версия меняется после коммита, иначе индекс, собранный до коммита,
+    лег бы под новую версию со старыми тегами.
+    """
+    transaction.on_commit(partial(bump_version, user_id))
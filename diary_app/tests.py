@@ -0,0 +1,46 @@
+import calendar
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from .query_plans import DAYS, check_diary_queries, plan_problems
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Разбор планов запросов реализован для SQLite')
+class DiaryQueryPlanTests(TestCase):
+    """Запросы diary_view идут по индексам при любом сочетании фильтров"""
+
+    def test_diary_queries_use_indexes(self):
+        for name, plan, problems in check_diary_queries():
+            with self.subTest(name):
+                self.assertEqual(problems, [], f'{name}:\n{plan}')
+
+    def test_days_include_february_28_of_non_leap_year(self):
+        # В этот день ищутся и записи за 29 февраля - отдельным запросом
+        self.assertTrue(any(
+            day.month == 2 and day.day == 28 and not calendar.isleap(day.year) for day in DAYS
+        ))
+        names = [name for name, plan, problems in check_diary_queries()]
+        self.assertEqual(names.count('В этот день (28.02.2027)'), 2)
+
+    def test_full_scan_is_reported(self):
+        plan = '2 0 0 SCAN diary_app_diaryentry'
+        self.assertEqual(plan_problems(plan, 'diary_app_diaryentry', {'user_id'}, False), [
+            'полный просмотр diary_app_diaryentry',
+        ])
+
+    def test_index_without_filter_columns_is_reported(self):
+        plan = '5 0 0 SEARCH diary_app_diaryentry USING INDEX some_user_idx (user_id=?)'
+        problems = plan_problems(plan, 'diary_app_diaryentry', {'user_id', 'mood'}, False)
+        self.assertEqual(problems, ['индекс some_user_idx не отбирает по mood'])
+
+    def test_sort_is_reported_for_paged_queries(self):
+        plan = (
+            '5 0 0 SEARCH diary_app_diaryentry USING INDEX some_user_idx (user_id=?)\n'
+            '20 0 0 USE TEMP B-TREE FOR ORDER BY'
+        )
+        self.assertEqual(plan_problems(plan, 'diary_app_diaryentry', {'user_id'}, True), [
+            'сортировка вместо порядка индекса',
+        ])
+        self.assertEqual(plan_problems(plan, 'diary_app_diaryentry', {'user_id'}, False), [])
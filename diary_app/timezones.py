@@ -0,0 +1,36 @@
+"""
+Часовые пояса пользователей.
+
+Пояс хранится в UserProfile.time_zone (пустая строка - TIME_ZONE
+сервера). UserTimezoneMiddleware включает его на время запроса, поэтому
+timezone.localdate() и вывод дат в шаблонах - по времени пользователя.
+По нему же заполняется DiaryEntry.local_date, и запросы по датам идут
+по индексу (user, local_date), а не через преобразование created_at
+в каждой строке.
+"""
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from django.utils import timezone
+
+
+def get_timezone(name):
+    """ZoneInfo по имени; пустое или неизвестное имя - пояс сервера"""
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.get_default_timezone()
+
+
+@lru_cache(maxsize=None)
+def timezone_choices():
+    return [('', 'Как на сервере')] + [
+        (name, name.replace('_', ' ')) for name in sorted(available_timezones())
+        if '/' in name and not name.startswith(('Etc/', 'SystemV/'))
+    ]
+
+
+def cache_key(user_id):
+    return f'timezone:{user_id}'
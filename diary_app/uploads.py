@@ -0,0 +1,136 @@
+"""
+Прием и нормализация загружаемых фотографий.
+
+Файлы пишутся сразу на диск кусками, слишком большие отбрасываются
+еще во время приема. Картинка сначала проверяется только по заголовку
+(размеры известны без декодирования), а JPEG декодируется через draft()
+уже уменьшенным, поэтому память воркера на одну загрузку ограничена
+настройками, а не тем, что прислал пользователь.
+"""
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Формат Pillow -> (формат сохранения, расширение, content-type, параметры)
+OUTPUT_FORMATS = {
+    'JPEG': ('JPEG', '.jpg', 'image/jpeg', {'quality': 85, 'optimize': True}),
+    'MPO': ('JPEG', '.jpg', 'image/jpeg', {'quality': 85, 'optimize': True}),
+    'PNG': ('PNG', '.png', 'image/png', {}),
+    'WEBP': ('WEBP', '.webp', 'image/webp', {'quality': 85}),
+}
+# GIF не содержит EXIF и может быть анимированным - сохраняется как есть
+PASSTHROUGH_FORMATS = {'GIF'}
+
+
+def max_file_size():
+    return getattr(settings, 'DIARY_UPLOAD_MAX_FILE_SIZE', 15 * 1024 * 1024)
+
+
+def max_files():
+    return getattr(settings, 'DIARY_UPLOAD_MAX_FILES', 10)
+
+
+def max_request_size():
+    return getattr(settings, 'DIARY_UPLOAD_MAX_REQUEST_SIZE', 60 * 1024 * 1024)
+
+
+def get_rejected_uploads(request):
+    """Сообщения о файлах, отброшенных обработчиком загрузки"""
+    return getattr(request, 'rejected_uploads', [])
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файлы во временные файлы на диске и отбрасывает слишком большие"""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.request_too_large = False
+        self.received = 0
+        self.files = 0
+        if request is not None:
+            request.rejected_uploads = []
+
+    def reject(self, message):
+        if self.request is not None:
+            self.request.rejected_uploads.append(message)
+        raise SkipFile()
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_too_large = content_length > max_request_size()
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        if self.request_too_large:
+            self.reject(f'{file_name}: общий размер загрузки больше {filesizeformat(max_request_size())}')
+        self.files += 1
+        if self.files > max_files():
+            self.reject(f'{file_name}: можно загрузить не больше {max_files()} фотографий за раз')
+        self.received = 0
+        super().new_file(field_name, file_name, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_file_size():
+            self.upload_interrupted()
+            self.reject(f'{self.file_name}: файл больше {filesizeformat(max_file_size())}')
+        return super().receive_data_chunk(raw_data, start)
+
+
+def normalize_image(uploaded):
+    """Проверяет фотографию и пересохраняет ее без EXIF с учетом ориентации.
+
+    Возвращает новый TemporaryUploadedFile (или исходный файл для GIF).
+    """
+    max_pixels = getattr(settings, 'DIARY_IMAGE_MAX_PIXELS', 50_000_000)
+    max_side = getattr(settings, 'DIARY_IMAGE_MAX_SIDE', 2560)
+
+    uploaded.seek(0)
+    try:
+        # Image.open читает только заголовок, пиксели пока не декодируются
+        image = Image.open(uploaded)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValidationError(f'{uploaded.name}: файл не является изображением')
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValidationError(
+            f'{uploaded.name}: слишком большое разрешение ({width}×{height}), '
+            f'максимум {max_pixels / 1_000_000:g} Мп'
+        )
+
+    if image.format in PASSTHROUGH_FORMATS:
+        uploaded.seek(0)
+        return uploaded
+    if image.format not in OUTPUT_FORMATS:
+        raise ValidationError(f'{uploaded.name}: формат {image.format} не поддерживается')
+    save_format, extension, content_type, save_options = OUTPUT_FORMATS[image.format]
+
+    try:
+        # Для JPEG декодер сразу уменьшает картинку в 2/4/8 раз
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if save_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        name = os.path.splitext(os.path.basename(uploaded.name))[0] + extension
+        normalized = TemporaryUploadedFile(name, content_type, 0, None)
+        # exif не передается, поэтому метаданные не попадают в новый файл
+        image.save(
+            normalized,
+            save_format,
+            icc_profile=image.info.get('icc_profile'),
+            **save_options,
+        )
+    except (OSError, ValueError, SyntaxError):
+        raise ValidationError(f'{uploaded.name}: не удалось обработать изображение')
+    finally:
+        image.close()
+
+    normalized.size = normalized.tell()
+    normalized.seek(0)
+    return normalized
@@ -16,7 +16,15 @@ urlpatterns = [
     path('entry/<int:pk>/', views.entry_detail, name='entry_detail'),
     path('entry/<int:pk>/edit/', views.entry_edit, name='entry_edit'),
     path('entry/<int:pk>/delete/', views.entry_delete, name='entry_delete'),
+    path('entry/<int:pk>/revisions/<int:number>/', views.entry_revision, name='entry_revision'),
     path('entry/<int:pk>/toggle-favorite/', views.entry_toggle_favorite, name='entry_toggle_favorite'),
+    path('entry/<int:pk>/update/', views.entry_update_fields, name='entry_update_fields'),
+    path('entries/bulk/', views.entries_bulk, name='entries_bulk'),
+    path('entries/restore/', views.entries_restore, name='entries_restore'),
+    path('tags/autocomplete/', views.tag_autocomplete, name='tag_autocomplete'),
+    path('drafts/autosave/', views.draft_autosave, name='draft_autosave'),
+    path('drafts/discard/', views.draft_discard, name='draft_discard'),
+    path('image/<int:pk>/', views.image_serve, name='image_serve'),
     path('image/<int:pk>/delete/', views.image_delete, name='image_delete'),
     
     # Профиль
@@ -0,0 +1,47 @@
+"""
+Векторизация текста записей для поиска похожих.
+
+Модуль не зависит от Django, чтобы его можно было выполнять в пуле
+процессов при перестроении индекса.
+"""
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Обрезка слов до префикса - грубый, но дешевый стемминг для русского
+STEM_LENGTH = 6
+MIN_TOKEN_LENGTH = 3
+TITLE_WEIGHT = 2
+TAG_WEIGHT = 3
+VECTOR_DTYPE = np.float16
+
+
+def tokenize(text):
+    return [
+        token[:STEM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) >= MIN_TOKEN_LENGTH and not token.isdigit()
+    ]
+
+
+def vectorize(title, content, tags, size):
+    """Вектор записи: логарифм частоты хэшированных признаков"""
+    counts = np.zeros(size, dtype=np.float32)
+    weighted = (
+        (tokenize(title), TITLE_WEIGHT),
+        (tokenize(content), 1),
+        (tokenize(tags.replace(',', ' ')), TAG_WEIGHT),
+    )
+    for tokens, weight in weighted:
+        for token in tokens:
+            counts[zlib.crc32(token.encode('utf-8')) % size] += weight
+    nonzero = counts > 0
+    counts[nonzero] = 1 + np.log(counts[nonzero])
+    return counts.astype(VECTOR_DTYPE)
+
+
+def vectorize_rows(rows, size):
+    """Векторы для пачки ``(pk, title, content, tags)``: список ``(pk, bytes)``"""
+    return [(pk, vectorize(title, content, tags, size).tobytes()) for pk, title, content, tags in rows]
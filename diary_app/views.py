@@ -1,12 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from django import forms
 from django.contrib import messages
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe, require_POST
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
+import calendar
+import heapq
 from datetime import datetime, timedelta
+from itertools import islice
 from .models import DiaryEntry, UserProfile, EntryImage
+from .media import serve_protected
+from .uploads import get_rejected_uploads
+from .revisions import record_revision, get_revision_content, diff_lines
+from .similarity import similar_entries, refresh_entries as refresh_similar_entries
+from .tags import complete_tags, invalidate_tag_index, parse_tags
+from .cards import render_entry_cards
+from .deletion import UNDO_SESSION_KEY, pending_undo, remember_for_undo, restore_entries, soft_delete_entries
+from .drafts import DRAFT_FIELDS, DraftConflict, autosave_draft, discard_draft, get_draft_state
 from .forms import (
     CustomUserCreationForm,
     CustomAuthenticationForm,
@@ -67,6 +82,32 @@ def logout_view(request):
     return redirect('home')
 
 
+def on_this_day_queries(user, today, limit=5):
+    """Запросы записей, сделанных в этот же день в прошлые годы.
+
+    29 февраля показывается 28 февраля невисокосного года. Каждый день -
+    отдельный запрос на равенство month_day: с ``month_day__in`` SQLite
+    выбирает индекс по local_date и читает всю историю пользователя.
+    """
+    month_days = [today.month * 100 + today.day]
+    if today.month == 2 and today.day == 28 and not calendar.isleap(today.year):
+        month_days.append(229)
+    return [
+        DiaryEntry.objects
+        .filter(user=user, month_day=month_day, local_date__lt=today)
+        .order_by('-local_date')
+        .only('pk', 'title', 'created_at', 'local_date', 'mood')[:limit]
+        for month_day in month_days
+    ]
+
+
+def on_this_day_entries(user, today, limit=5):
+    """Записи, сделанные в этот же день в прошлые годы, новые первыми"""
+    queries = on_this_day_queries(user, today, limit)
+    entries = heapq.merge(*queries, key=lambda entry: entry.local_date, reverse=True)
+    return list(islice(entries, limit))
+
+
 @login_required
 def diary_view(request):
     """Главная страница дневника со списком записей"""
@@ -77,18 +118,7 @@ def diary_view(request):
     mood_filter = request.GET.get('mood', '')
     favorite_filter = request.GET.get('favorite', '')
     
-    if search_query:
-        entries = entries.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(tags__icontains=search_query)
-        )
-    
-    if mood_filter:
-        entries = entries.filter(mood=mood_filter)
-    
-    if favorite_filter == 'true':
-        entries = entries.filter(is_favorite=True)
+    entries = entries.apply_filters(search_query, mood_filter, favorite_filter == 'true')
     
     # Пагинация
     paginator = Paginator(entries, 10)
@@ -98,20 +128,23 @@ def diary_view(request):
     # Статистика
     total_entries = DiaryEntry.objects.filter(user=request.user).count()
     favorite_count = DiaryEntry.objects.filter(user=request.user, is_favorite=True).count()
-    today_entries = DiaryEntry.objects.filter(
-        user=request.user,
-        created_at__date=timezone.now().date()
-    ).count()
+    # Дата по часовому поясу пользователя (см. UserTimezoneMiddleware)
+    today = timezone.localdate()
+    today_entries = DiaryEntry.objects.filter(user=request.user, local_date=today).count()
+    on_this_day = on_this_day_entries(request.user, today)
     
     context = {
         'page_obj': page_obj,
         'entries': page_obj,
+        'cards': render_entry_cards(page_obj),
         'search_query': search_query,
         'mood_filter': mood_filter,
         'favorite_filter': favorite_filter,
         'total_entries': total_entries,
         'favorite_count': favorite_count,
         'today_entries': today_entries,
+        'on_this_day': on_this_day,
+        'undo_ids': pending_undo(request),
     }
     
     return render(request, 'diary_app/diary.html', context)
@@ -121,54 +154,179 @@ def diary_view(request):
 def entry_create(request):
     """Создание новой записи"""
     if request.method == 'POST':
-        form = DiaryEntryForm(request.POST, request.FILES)
+        form = DiaryEntryForm(request.POST, request.FILES, rejected_uploads=get_rejected_uploads(request))
         if form.is_valid():
             entry = form.save(commit=False)
             entry.user = request.user
             entry.save()
+            record_revision(entry)
+            discard_draft(request.user)
             
-            # Обработка загруженных изображений
-            images = request.FILES.getlist('images')
+            # Обработка загруженных изображений (уже проверены и пересохранены формой)
+            images = form.cleaned_data['images']
             for image in images:
                 EntryImage.objects.create(entry=entry, image=image)
+                image.close()
             
             messages.success(request, 'Запись успешно создана!')
             return redirect('entry_detail', pk=entry.pk)
     else:
         form = DiaryEntryForm()
     
-    return render(request, 'diary_app/entry_form.html', {'form': form, 'action': 'Создать'})
+    return render(request, 'diary_app/entry_form.html', {
+        'form': form,
+        'action': 'Создать',
+        'draft': draft_context(request.user),
+    })
 
 
 @login_required
 def entry_detail(request, pk):
     """Детальный просмотр записи"""
     entry = get_object_or_404(DiaryEntry, pk=pk, user=request.user)
+    entry.load_content()
     images = entry.images.all()
-    return render(request, 'diary_app/entry_detail.html', {'entry': entry, 'images': images})
+    revisions = entry.revisions.only('entry_id', 'number', 'kind', 'created_at')
+    
+    # Похожие записи: порядок из индекса, данные одним запросом
+    similar = similar_entries(entry)
+    related = DiaryEntry.objects.only('pk', 'title', 'created_at').in_bulk([pk for pk, score in similar])
+    related_entries = [related[pk] for pk, score in similar if pk in related]
+    
+    return render(request, 'diary_app/entry_detail.html', {
+        'entry': entry,
+        'images': images,
+        'revisions': revisions,
+        'related_entries': related_entries,
+    })
+
+
+@login_required
+def entry_revision(request, pk, number):
+    """Просмотр версии записи и отличий от предыдущей"""
+    entry = get_object_or_404(DiaryEntry, pk=pk, user=request.user)
+    revision = get_object_or_404(entry.revisions.defer('data'), number=number)
+    content = get_revision_content(entry, number)
+    
+    previous = entry.revisions.filter(number__lt=number).only('number').first()
+    previous_content = get_revision_content(entry, previous.number) if previous else ''
+    
+    context = {
+        'entry': entry,
+        'revision': revision,
+        'previous': previous,
+        'content': content,
+        'diff': diff_lines(previous_content, content),
+    }
+    return render(request, 'diary_app/entry_revision.html', context)
 
 
 @login_required
 def entry_edit(request, pk):
     """Редактирование записи"""
     entry = get_object_or_404(DiaryEntry, pk=pk, user=request.user)
+    # Отредактированная архивная запись снова хранится целиком
+    entry.load_content()
     
     if request.method == 'POST':
-        form = DiaryEntryForm(request.POST, request.FILES, instance=entry)
+        # Запись, созданная до появления истории, получает исходную версию
+        record_revision(entry)
+        form = DiaryEntryForm(
+            request.POST, request.FILES, instance=entry,
+            rejected_uploads=get_rejected_uploads(request)
+        )
         if form.is_valid():
             form.save()
+            record_revision(entry)
+            discard_draft(request.user, entry.pk)
             
-            # Обработка новых загруженных изображений
-            images = request.FILES.getlist('images')
+            # Обработка новых загруженных изображений (уже проверены и пересохранены формой)
+            images = form.cleaned_data['images']
             for image in images:
                 EntryImage.objects.create(entry=entry, image=image)
+                image.close()
             
             messages.success(request, 'Запись успешно обновлена!')
             return redirect('entry_detail', pk=entry.pk)
     else:
         form = DiaryEntryForm(instance=entry)
     
-    return render(request, 'diary_app/entry_form.html', {'form': form, 'entry': entry, 'action': 'Редактировать'})
+    return render(request, 'diary_app/entry_form.html', {
+        'form': form,
+        'entry': entry,
+        'action': 'Редактировать',
+        'draft': draft_context(request.user, entry.pk),
+    })
+
+
+def draft_context(user, entry_id=None):
+    """Черновик для шаблона формы (передается в JS через json_script)"""
+    state = get_draft_state(user, entry_id)
+    if state is None:
+        return {'entry': entry_id, 'version': 0, 'fields': None}
+    return {
+        'entry': entry_id,
+        'version': state['version'],
+        'saved_at': state['saved_at'].isoformat(),
+        'fields': {field: state[field] for field in DRAFT_FIELDS},
+    }
+
+
+@login_required
+@require_safe
+def tag_autocomplete(request):
+    """Подсказки тегов по префиксу (AJAX, без запросов к записям)"""
+    prefix = request.GET.get('q', '')
+    tags = [
+        {'tag': tag, 'count': count}
+        for tag, count in complete_tags(request.user.pk, prefix)
+    ]
+    return JsonResponse({'tags': tags})
+
+
+def draft_entry_id(request):
+    """pk записи, к которой относится черновик (None для новой записи)"""
+    entry_id = request.POST.get('entry') or None
+    if entry_id is None:
+        return None
+    return get_object_or_404(DiaryEntry.objects.only('pk'), pk=entry_id, user=request.user).pk
+
+
+@login_required
+@require_POST
+def draft_autosave(request):
+    """Автосохранение черновика (AJAX)"""
+    entry_id = draft_entry_id(request)
+    try:
+        base_version = int(request.POST.get('version', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Не указана версия черновика'}, status=400)
+    
+    try:
+        state = autosave_draft(
+            request.user, entry_id, request.POST, base_version,
+            force_flush=request.POST.get('flush') == '1'
+        )
+    except DraftConflict as conflict:
+        return JsonResponse({
+            'conflict': True,
+            'version': conflict.state['version'],
+            'fields': {field: conflict.state[field] for field in DRAFT_FIELDS},
+        }, status=409)
+    
+    return JsonResponse({
+        'version': state['version'],
+        'saved_at': state['saved_at'].isoformat(),
+        'flushed': not state['dirty'],
+    })
+
+
+@login_required
+@require_POST
+def draft_discard(request):
+    """Удаление черновика"""
+    discard_draft(request.user, draft_entry_id(request))
+    return JsonResponse({'discarded': True})
 
 
 @login_required
@@ -177,19 +335,29 @@ def entry_delete(request, pk):
     entry = get_object_or_404(DiaryEntry, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        entry.delete()
+        soft_delete_entries(request.user.pk, [entry.pk])
+        remember_for_undo(request, [entry.pk])
         messages.success(request, 'Запись удалена')
         return redirect('diary')
     
     return render(request, 'diary_app/entry_delete.html', {'entry': entry})
 
 
+def wants_json(request):
+    """Запрос пришел из JS и ждет JSON вместо редиректа"""
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
 @login_required
+@require_POST
 def entry_toggle_favorite(request, pk):
     """Переключение избранного"""
-    entry = get_object_or_404(DiaryEntry, pk=pk, user=request.user)
+    entry = get_object_or_404(DiaryEntry.objects.only('pk', 'user_id', 'is_favorite'), pk=pk, user=request.user)
     entry.is_favorite = not entry.is_favorite
-    entry.save()
+    entry.save(update_fields=['is_favorite', 'updated_at'])
+    
+    if wants_json(request):
+        return JsonResponse({'is_favorite': entry.is_favorite})
     
     if entry.is_favorite:
         messages.success(request, 'Запись добавлена в избранное')
@@ -199,10 +367,113 @@ def entry_toggle_favorite(request, pk):
     return redirect('entry_detail', pk=entry.pk)
 
 
+# Поля, которые можно менять по одному без формы редактирования
+PATCHABLE_FIELDS = ('is_favorite', 'mood', 'tags')
+
+
+@login_required
+@require_POST
+def entry_update_fields(request, pk):
+    """Обновление отдельных полей записи (AJAX), пишутся только они"""
+    entry = get_object_or_404(DiaryEntry.objects.only('pk', 'user_id', *PATCHABLE_FIELDS), pk=pk, user=request.user)
+    fields = [name for name in PATCHABLE_FIELDS if name in request.POST]
+    if not fields:
+        return JsonResponse({'error': 'Нет полей для обновления'}, status=400)
+    
+    form_fields = DiaryEntryForm.base_fields
+    errors = {}
+    for name in fields:
+        try:
+            value = form_fields[name].clean(request.POST[name])
+        except forms.ValidationError as error:
+            errors[name] = error.messages
+            continue
+        if name == 'mood':
+            value = value or None
+        setattr(entry, name, value)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    
+    entry.save(update_fields=fields + ['updated_at'])
+    return JsonResponse({name: getattr(entry, name) for name in fields})
+
+
+BULK_ACTIONS = ('favorite', 'unfavorite', 'retag', 'delete')
+
+
+@login_required
+@require_POST
+def entries_bulk(request):
+    """Массовые действия над выбранными записями одним UPDATE/DELETE"""
+    action = request.POST.get('action')
+    try:
+        ids = [int(pk) for pk in request.POST.getlist('ids')]
+    except ValueError:
+        ids = []
+    if action not in BULK_ACTIONS or not ids:
+        if wants_json(request):
+            return JsonResponse({'error': 'Выберите записи и действие'}, status=400)
+        messages.error(request, 'Выберите записи и действие')
+        return redirect('diary')
+    
+    entries = DiaryEntry.objects.filter(user=request.user, pk__in=ids)
+    now = timezone.now()
+    if action == 'favorite':
+        count = entries.update(is_favorite=True, updated_at=now)
+        message = f'Добавлено в избранное: {count}'
+    elif action == 'unfavorite':
+        count = entries.update(is_favorite=False, updated_at=now)
+        message = f'Убрано из избранного: {count}'
+    elif action == 'retag':
+        tags = ', '.join(parse_tags(request.POST.get('tags', '')))
+        count = entries.update(tags=tags, updated_at=now)
+        # update() не вызывает сигналы - обновляем производные индексы сами
+        invalidate_tag_index(request.user.pk)
+        refresh_similar_entries(request.user.pk, ids)
+        message = f'Теги изменены: {count}'
+    else:
+        count = soft_delete_entries(request.user.pk, ids)
+        remember_for_undo(request, ids)
+        message = f'Удалено записей: {count}'
+    
+    if wants_json(request):
+        return JsonResponse({'action': action, 'count': count})
+    messages.success(request, message)
+    return redirect('diary')
+
+
+@login_required
+@require_POST
+def entries_restore(request):
+    """Отмена удаления записей, пока не истекло окно отмены"""
+    try:
+        ids = [int(pk) for pk in request.POST.getlist('ids')]
+    except ValueError:
+        ids = []
+    count = restore_entries(request.user.pk, ids)
+    request.session.pop(UNDO_SESSION_KEY, None)
+    
+    if wants_json(request):
+        return JsonResponse({'count': count})
+    if count:
+        messages.success(request, f'Восстановлено записей: {count}')
+    else:
+        messages.error(request, 'Время для отмены удаления истекло')
+    return redirect('diary')
+
+
+@login_required
+@require_safe
+def image_serve(request, pk):
+    """Отдача фотографии только владельцу записи"""
+    image = get_object_or_404(EntryImage, pk=pk, entry__user=request.user, entry__deleted_at__isnull=True)
+    return serve_protected(request, image.image)
+
+
 @login_required
 def image_delete(request, pk):
     """Удаление изображения"""
-    image = get_object_or_404(EntryImage, pk=pk, entry__user=request.user)
+    image = get_object_or_404(EntryImage, pk=pk, entry__user=request.user, entry__deleted_at__isnull=True)
     entry_pk = image.entry.pk
     
     if request.method == 'POST':
@@ -223,21 +494,24 @@ def profile_view(request):
     total_entries = DiaryEntry.objects.filter(user=request.user).count()
     favorite_count = DiaryEntry.objects.filter(user=request.user, is_favorite=True).count()
     
-    # Статистика по месяцам
-    now = timezone.now()
-    months_stats = []
+    # Статистика по месяцам: один проход по индексу (user, local_date)
+    months = []
+    month = timezone.localdate().replace(day=1)
     for i in range(6):
-        month_start = now.replace(day=1) - timedelta(days=30*i)
-        month_end = month_start + timedelta(days=30)
-        count = DiaryEntry.objects.filter(
-            user=request.user,
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-        months_stats.append({
-            'month': month_start.strftime('%B %Y'),
-            'count': count
-        })
+        months.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    counts = dict(
+        DiaryEntry.objects
+        .filter(user=request.user, local_date__gte=months[-1])
+        .annotate(month=TruncMonth('local_date'))
+        .values_list('month')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    months_stats = [
+        {'month': month.strftime('%B %Y'), 'count': counts.get(month, 0)}
+        for month in months
+    ]
     
     context = {
         'profile': profile,
@@ -256,7 +530,10 @@ def profile_edit(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     if request.method == 'POST':
-        form = UserProfileForm(request.POST, request.FILES, instance=profile)
+        form = UserProfileForm(
+            request.POST, request.FILES, instance=profile,
+            rejected_uploads=get_rejected_uploads(request)
+        )
         if form.is_valid():
             form.save()
             messages.success(request, 'Профиль обновлен!')
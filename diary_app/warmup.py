@@ -0,0 +1,84 @@
+"""
+Прогрев воркера при старте.
+
+Вызывается из MeMind/wsgi.py и MeMind/asgi.py, если DIARY_WARMUP = True.
+Все, что иначе происходило бы лениво на первых запросах (компиляция
+шаблонов, построение URL-резолвера, загрузка плагинов Pillow,
+подключение к БД), делается заранее. NumPy отдельно не грузится: его
+импортирует diary_app.signals еще при запуске Django.
+
+С ``gunicorn --preload`` модуль wsgi загружается в мастер-процессе до
+fork, а соединения с БД нельзя делить между процессами; в этом случае
+warm_up() нужно вызывать из хука post_fork.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def load_templates():
+    """Компилирует шаблоны приложения (попадают в кэш cached.Loader)"""
+    app_config = apps.get_app_config('diary_app')
+    templates_dir = Path(app_config.path) / 'templates'
+    for path in sorted(templates_dir.rglob('*.html')):
+        get_template(path.relative_to(templates_dir).as_posix())
+
+
+def resolve_urls():
+    """Строит URL-резолвер и таблицы reverse()"""
+    # reverse_dict заполняется (с обходом include) при первом обращении
+    len(get_resolver().reverse_dict)
+
+
+def load_pillow():
+    from PIL import Image
+    Image.init()
+
+
+def open_connections():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def prime_caches():
+    from .compression import get_latest_dictionary
+    get_latest_dictionary()
+
+
+STEPS = [
+    ('templates', load_templates),
+    ('urls', resolve_urls),
+    ('pillow', load_pillow),
+    ('database', open_connections),
+    ('caches', prime_caches),
+]
+
+
+def warm_up():
+    """Выполняет все шаги прогрева, возвращает время каждого в секундах.
+    
+    Ошибка прогрева не должна мешать воркеру стартовать, поэтому
+    она только пишется в лог.
+    """
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Шаг прогрева %s завершился ошибкой', name)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def warm_up_if_enabled():
+    if getattr(settings, 'DIARY_WARMUP', False):
+        warm_up()